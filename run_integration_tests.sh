@@ -12,7 +12,7 @@ source venv/bin/activate
 # Install dependencies
 echo "Installing dependencies..."
 pip install -r requirements.txt
-pip install pytest pytest-cov docker
+pip install pytest pytest-cov docker "testcontainers[neo4j]>=4"
 
 # Run integration tests
 echo "Running integration tests..."
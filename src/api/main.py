@@ -4,15 +4,25 @@ Main API module for the Blueprint Graph application.
 This module provides a FastAPI application for interacting with the detection engine.
 """
 import os
-import json
-from typing import Dict, Any, List, Optional
+import uuid
+import asyncio
+import itertools
+from typing import Dict, Any, AsyncIterator, Generator, List, Optional
 from fastapi import FastAPI, HTTPException, Depends, Query, Body, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, ConfigDict, Field
+import orjson
 import uvicorn
-from src.utils import settings, log, db
-from src.core import DetectionRule, DetectionAlert, detection_engine
+from neo4j.exceptions import ClientError
+from neo4j.graph import Node, Relationship
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from src.utils import settings, log, db, query_cache, json_loads, entity_id, phase
+from src.utils.profiling import PhaseTimingMiddleware
+from src.core import DetectionRule, DetectionAlert, detection_engine, store_events, create_indexes
 from src.schemas import ocsf_schema
+from src.kafka.producer import get_producer, close_producer
 import time
 
 
@@ -20,17 +30,78 @@ import time
 app = FastAPI(
     title="Blueprint Graph API",
     description="API for the Blueprint Graph OCSF Detection Engine",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
-# Add CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+# Add CORS middleware only when browser clients need it, since every request pays for it
+if settings.enable_cors:
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+# Add phase timing middleware to find where request time is spent
+if settings.enable_profiling:
+    app.add_middleware(PhaseTimingMiddleware)
+
+
+# Keys that are not properties of alert entities, and of node- and
+# relationship-shaped maps returned by graph queries
+ALERT_ENTITY_KEYS = frozenset(["id", "type", "entity_type"])
+NODE_MAP_KEYS = frozenset(["id", "labels"])
+RELATIONSHIP_MAP_KEYS = frozenset(["id", "type", "start", "end"])
+
+# Query reading an event by its database ID
+GET_EVENT_QUERY = """
+MATCH (e:Event) WHERE id(e) = toInteger($event_id)
+RETURN e
+"""
+
+
+def _build_alerts_query(by_severity: bool, by_rule_id: bool) -> str:
+    """
+    Build the query listing the latest alerts with the entities they involve.
+    
+    Args:
+        by_severity (bool): Whether to filter by $severity
+        by_rule_id (bool): Whether to filter by $rule_id
+        
+    Returns:
+        str: The Cypher query
+    """
+    query = "MATCH (a:Alert)"
+    where_clauses = []
+    
+    if by_severity:
+        where_clauses.append("a.severity = $severity")
+    
+    if by_rule_id:
+        where_clauses.append("a.rule_id = $rule_id")
+    
+    if where_clauses:
+        query += " WHERE " + " AND ".join(where_clauses)
+    
+    # Collect the entities involved in each alert in the same query
+    query += """
+    WITH a ORDER BY a.timestamp DESC LIMIT $limit
+    OPTIONAL MATCH (a)-[:INVOLVES]->(e)
+    WITH a, collect(CASE WHEN e IS NULL THEN NULL ELSE {e: e, labels: labels(e)} END) AS entities
+    RETURN a, entities
+    ORDER BY a.timestamp DESC
+    """
+    
+    return query
+
+
+# Alert listing queries for every combination of filters, keyed by (by_severity, by_rule_id)
+ALERTS_QUERIES = {
+    (by_severity, by_rule_id): _build_alerts_query(by_severity, by_rule_id)
+    for by_severity, by_rule_id in itertools.product([False, True], repeat=2)
+}
 
 
 # Pydantic models for API
@@ -43,10 +114,14 @@ class RuleCreate(BaseModel):
     tags: List[str] = Field(default_factory=list, description="List of tags for categorization")
     mitre_techniques: List[str] = Field(default_factory=list, description="List of MITRE ATT&CK techniques")
     enabled: bool = Field(True, description="Whether the rule is enabled")
+    parameters: Dict[str, Any] = Field(default_factory=dict, description="Values of the query's $parameters")
 
 
 class RuleResponse(BaseModel):
     """Model for rule response."""
+    # Handlers return DetectionRule objects directly; FastAPI validates them once
+    model_config = ConfigDict(from_attributes=True)
+    
     rule_id: str = Field(..., description="Unique identifier for the rule")
     name: str = Field(..., description="Human-readable name for the rule")
     description: str = Field(..., description="Description of what the rule detects")
@@ -55,10 +130,14 @@ class RuleResponse(BaseModel):
     tags: List[str] = Field(default_factory=list, description="List of tags for categorization")
     mitre_techniques: List[str] = Field(default_factory=list, description="List of MITRE ATT&CK techniques")
     enabled: bool = Field(..., description="Whether the rule is enabled")
+    parameters: Dict[str, Any] = Field(default_factory=dict, description="Values of the query's $parameters")
 
 
 class AlertResponse(BaseModel):
     """Model for alert response."""
+    # Handlers return DetectionAlert objects directly; FastAPI validates them once
+    model_config = ConfigDict(from_attributes=True)
+    
     alert_id: str = Field(..., description="Unique identifier for the alert")
     rule_id: str = Field(..., description="ID of the rule that generated the alert")
     timestamp: str = Field(..., description="Timestamp when the alert was generated")
@@ -83,6 +162,100 @@ class GraphQueryRequest(BaseModel):
     query: str
 
 
+async def _execute_read_query(query: str, params: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """
+    Execute a read-only query, serving repeated calls from the query cache.
+    
+    Empty results are not cached. Events written by the Kafka consumer do not
+    invalidate this process's cache, so a cached miss could hide a new event
+    for the whole time-to-live.
+    
+    Args:
+        query: The Cypher query to execute
+        params: Query parameters
+        
+    Returns:
+        Query results
+    """
+    # Taken before reading, so a result read across a write is not cached
+    version = query_cache.version
+    result = query_cache.get(query, params)
+    
+    if result is None:
+        with phase("graph_read"):
+            result = await db.execute_query_async(query, params)
+        if result:
+            query_cache.set(query, params, result, version=version)
+    
+    return result
+
+
+async def _gather_bounded(func, items: List[Any], limit: Optional[int] = None) -> List[Any]:
+    """
+    Run a blocking function over items in worker threads, a bounded number at a time.
+    
+    Args:
+        func: Blocking function to call with each item
+        items: Items to process
+        limit: Maximum number of concurrent calls (defaults to settings.detection_concurrency)
+        
+    Returns:
+        Results in the same order as the items
+    """
+    semaphore = asyncio.Semaphore(limit or settings.detection_concurrency)
+    
+    async def run(item):
+        async with semaphore:
+            return await run_in_threadpool(func, item)
+    
+    return await asyncio.gather(*[run(item) for item in items])
+
+
+async def _store_alerts(alerts: List[DetectionAlert]) -> None:
+    """
+    Store alerts in the database with a single bulk write.
+    
+    If the bulk write fails, the alerts are stored one by one, so a single
+    bad alert does not lose the others.
+    
+    Args:
+        alerts: Alerts to store
+        
+    Raises:
+        HTTPException: If any alert could not be stored
+    """
+    with phase("store_alerts"):
+        stored = await run_in_threadpool(detection_engine.store_alerts_bulk, alerts)
+        
+        if stored:
+            failed = 0
+        else:
+            results = await run_in_threadpool(lambda: [detection_engine.store_alert(alert) for alert in alerts])
+            failed = results.count(False)
+    
+    if alerts and failed < len(alerts):
+        query_cache.invalidate()
+    
+    if failed:
+        raise HTTPException(status_code=500, detail=f"Failed to store {failed} of {len(alerts)} alerts")
+
+
+async def _compile_rule(rule: DetectionRule) -> None:
+    """
+    Compile a rule's query before it is loaded, rejecting invalid queries.
+    
+    Args:
+        rule: Rule to compile
+        
+    Raises:
+        HTTPException: If the query is not valid Cypher
+    """
+    try:
+        await run_in_threadpool(detection_engine.compile_rule, rule)
+    except ClientError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid rule query: {e.message}")
+
+
 # API routes
 @app.get("/")
 async def root():
@@ -95,7 +268,7 @@ async def health():
     """Health check endpoint."""
     try:
         # Check database connection
-        result = db.execute_query("RETURN 1 as test")
+        result = await db.execute_query_async("RETURN 1 as test")
         if result and result[0]["test"] == 1:
             return {"status": "healthy", "database": "connected"}
         else:
@@ -117,8 +290,6 @@ async def kafka_health():
         if not settings.use_kafka:
             return {"status": "disabled", "message": "Kafka is disabled in configuration"}
         
-        from src.kafka.producer import get_producer
-        
         # Get the Kafka producer
         producer = get_producer()
         
@@ -129,7 +300,7 @@ async def kafka_health():
                 "source_format": "test"
             }
             
-            success = producer.send_event(test_message)
+            success = await run_in_threadpool(producer.send_event, test_message)
             
             if success:
                 return {
@@ -159,6 +330,36 @@ async def kafka_health():
         }
 
 
+@app.get("/metrics")
+async def metrics():
+    """
+    Prometheus metrics endpoint.
+    
+    Phase timings are only recorded when ENABLE_PROFILING is set.
+    
+    Returns:
+        Metrics in the Prometheus text format
+    """
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
+@app.get("/cache/stats", response_model=Dict[str, Any])
+async def cache_stats():
+    """
+    Get query cache statistics.
+    
+    Returns:
+        Query cache size, limits, and hit/miss counters
+    """
+    return query_cache.stats()
+
+
+@app.post("/cache/clear", status_code=status.HTTP_204_NO_CONTENT)
+async def cache_clear():
+    """Clear the query cache."""
+    query_cache.clear()
+
+
 @app.get("/rules", response_model=List[RuleResponse])
 async def get_rules(
     enabled: Optional[bool] = Query(None, description="Filter by enabled status"),
@@ -174,18 +375,7 @@ async def get_rules(
     Returns:
         List of detection rules
     """
-    rules = []
-    
-    for rule_id, rule in detection_engine.rules.items():
-        if enabled is not None and rule.enabled != enabled:
-            continue
-        
-        if tag is not None and tag not in rule.tags:
-            continue
-        
-        rules.append(RuleResponse(**rule.to_dict()))
-    
-    return rules
+    return detection_engine.find_rules(enabled=enabled, tag=tag)
 
 
 @app.get("/rules/{rule_id}", response_model=RuleResponse)
@@ -199,11 +389,12 @@ async def get_rule(rule_id: str):
     Returns:
         Detection rule
     """
-    if rule_id not in detection_engine.rules:
+    rule = detection_engine.rules.get(rule_id)
+    
+    if rule is None:
         raise HTTPException(status_code=404, detail=f"Rule not found: {rule_id}")
     
-    rule = detection_engine.rules[rule_id]
-    return RuleResponse(**rule.to_dict())
+    return rule
 
 
 @app.post("/rules", response_model=RuleResponse, status_code=status.HTTP_201_CREATED)
@@ -217,8 +408,6 @@ async def create_rule(rule: RuleCreate):
     Returns:
         Created rule
     """
-    import uuid
-    
     rule_id = f"RULE-{str(uuid.uuid4())[:8]}"
     
     detection_rule = DetectionRule(
@@ -229,12 +418,54 @@ async def create_rule(rule: RuleCreate):
         query=rule.query,
         tags=rule.tags,
         mitre_techniques=rule.mitre_techniques,
-        enabled=rule.enabled
+        enabled=rule.enabled,
+        parameters=rule.parameters
     )
     
+    await _compile_rule(detection_rule)
     detection_engine.load_rule(detection_rule)
     
-    return RuleResponse(**detection_rule.to_dict())
+    return detection_rule
+
+
+@app.post("/rules/batch", response_model=List[RuleResponse], status_code=status.HTTP_201_CREATED)
+async def create_rules(rules: List[RuleCreate]):
+    """
+    Create a batch of detection rules.
+    
+    All queries are compiled before any rule is loaded, so an invalid query
+    rejects the whole batch.
+    
+    Args:
+        rules: Rules to create
+        
+    Returns:
+        Created rules, in the same order as the input
+    """
+    detection_rules = [
+        DetectionRule(
+            rule_id=f"RULE-{str(uuid.uuid4())[:8]}",
+            name=rule.name,
+            description=rule.description,
+            severity=rule.severity,
+            query=rule.query,
+            tags=rule.tags,
+            mitre_techniques=rule.mitre_techniques,
+            enabled=rule.enabled,
+            parameters=rule.parameters
+        )
+        for rule in rules
+    ]
+    
+    try:
+        await _gather_bounded(detection_engine.compile_rule, detection_rules)
+    except ClientError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid rule query: {e.message}")
+    
+    for detection_rule in detection_rules:
+        detection_engine.load_rule(detection_rule)
+    
+    return detection_rules
 
 
 @app.put("/rules/{rule_id}", response_model=RuleResponse)
@@ -260,12 +491,14 @@ async def update_rule(rule_id: str, rule: RuleCreate):
         query=rule.query,
         tags=rule.tags,
         mitre_techniques=rule.mitre_techniques,
-        enabled=rule.enabled
+        enabled=rule.enabled,
+        parameters=rule.parameters
     )
     
-    detection_engine.rules[rule_id] = detection_rule
+    await _compile_rule(detection_rule)
+    detection_engine.load_rule(detection_rule)
     
-    return RuleResponse(**detection_rule.to_dict())
+    return detection_rule
 
 
 @app.delete("/rules/{rule_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -276,10 +509,8 @@ async def delete_rule(rule_id: str):
     Args:
         rule_id: ID of the rule to delete
     """
-    if rule_id not in detection_engine.rules:
+    if not detection_engine.remove_rule(rule_id):
         raise HTTPException(status_code=404, detail=f"Rule not found: {rule_id}")
-    
-    del detection_engine.rules[rule_id]
 
 
 @app.post("/rules/{rule_id}/run", response_model=List[AlertResponse])
@@ -296,13 +527,13 @@ async def run_rule(rule_id: str):
     if rule_id not in detection_engine.rules:
         raise HTTPException(status_code=404, detail=f"Rule not found: {rule_id}")
     
-    alerts = detection_engine.run_detection(rule_id)
+    with phase("detection"):
+        alerts = await run_in_threadpool(detection_engine.run_detection, rule_id)
     
     # Store alerts in the database
-    for alert in alerts:
-        detection_engine.store_alert(alert)
+    await _store_alerts(alerts)
     
-    return [AlertResponse(**alert.to_dict()) for alert in alerts]
+    return alerts
 
 
 @app.post("/run-detection", response_model=List[AlertResponse])
@@ -313,139 +544,160 @@ async def run_detection():
     Returns:
         List of alerts generated by all rules
     """
-    alerts = detection_engine.run_detection()
+    # Run the enabled rules concurrently; results keep the rule order
+    rule_ids = [rule.rule_id for rule in detection_engine.find_rules(enabled=True)]
+    with phase("detection"):
+        rule_alerts = await _gather_bounded(detection_engine.run_detection, rule_ids)
+    alerts = list(itertools.chain.from_iterable(rule_alerts))
     
     # Store alerts in the database
-    for alert in alerts:
-        detection_engine.store_alert(alert)
+    await _store_alerts(alerts)
     
-    return [AlertResponse(**alert.to_dict()) for alert in alerts]
+    return alerts
 
 
-@app.post("/events", response_model=EventResponse, status_code=status.HTTP_201_CREATED)
-async def create_event(event_data: EventCreate):
+def _map_events(events: List[EventCreate]) -> List[Dict[str, Any]]:
     """
-    Create a new event.
+    Map incoming events to OCSF.
     
     Args:
-        event_data: Event data to create
+        events: Events to map
         
     Returns:
-        Created event
+        List of OCSF events, in the same order as the input
     """
-    try:
+    ocsf_events = []
+    
+    for event_data in events:
         # Map to OCSF if not already in OCSF format
         if event_data.source_format != "ocsf":
-            ocsf_event = ocsf_schema.map_to_ocsf(event_data.event, event_data.source_format)
+            ocsf_events.append(ocsf_schema.map_to_ocsf(event_data.event, event_data.source_format))
         else:
-            ocsf_event = event_data.event
+            ocsf_events.append(event_data.event)
+    
+    return ocsf_events
+
+
+def _store_events(ocsf_events: List[Dict[str, Any]]) -> List[str]:
+    """
+    Store OCSF events in the graph database and invalidate the query cache.
+    
+    Args:
+        ocsf_events: OCSF events to store
         
-        # Check if we should use Kafka
-        if settings.use_kafka:
-            from src.kafka.producer import get_producer
-            
-            # Get the Kafka producer
-            producer = get_producer()
-            
-            if producer:
-                # Send the event to Kafka
-                kafka_message = {
+    Returns:
+        List of database IDs, in the same order as the input
+    """
+    try:
+        return store_events(ocsf_events)
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail="Failed to create event") from e
+    finally:
+        query_cache.invalidate()
+
+
+def _ingest_events(events: List[EventCreate]) -> List[Dict[str, Any]]:
+    """
+    Map a batch of events to OCSF and hand it to Kafka or the graph database.
+    
+    Args:
+        events: Events to ingest
+        
+    Returns:
+        List of created events, in the same order as the input
+    """
+    with phase("ocsf_map"):
+        ocsf_events = _map_events(events)
+    
+    # Check if we should use Kafka
+    if settings.use_kafka:
+        # Get the Kafka producer
+        producer = get_producer()
+        
+        if producer:
+            # Send the whole batch to Kafka and wait for its delivery reports
+            kafka_messages = [
+                {
                     "event": ocsf_event,
                     "source_format": "ocsf"  # Already mapped to OCSF
                 }
-                
-                success = producer.send_event(kafka_message)
-                
-                if success:
-                    # For Kafka mode, we generate a temporary ID since the actual DB ID will be created by the consumer
-                    # In a production system, you might want to use a more robust ID generation strategy
-                    import uuid
-                    temp_id = str(uuid.uuid4())
-                    
-                    log.info(f"Event sent to Kafka with temporary ID: {temp_id}")
-                    return EventResponse(id=temp_id, event=ocsf_event)
-                else:
-                    raise HTTPException(status_code=500, detail="Failed to send event to Kafka")
-            else:
-                log.warning("Kafka producer not available, falling back to direct database write")
-        
-        # If not using Kafka or Kafka producer not available, store directly in the database
-        # Store in graph database
-        query = """
-        CREATE (e:Event {
-            class_uid: $class_uid,
-            category_uid: $category_uid,
-            time: $time,
-            severity: $severity,
-            message: $message,
-            metadata: $metadata
-        })
-        RETURN id(e) as id
-        """
-        
-        params = {
-            "class_uid": ocsf_event.get("class_uid", "unknown"),
-            "category_uid": ocsf_event.get("category_uid", "unknown"),
-            "time": ocsf_event.get("time", ""),
-            "severity": ocsf_event.get("severity", 0),
-            "message": ocsf_event.get("message", ""),
-            "metadata": json.dumps(ocsf_event.get("metadata", {}))
-        }
-        
-        result = db.execute_query(query, params)
-        
-        if result and len(result) > 0:
-            event_id = str(result[0]["id"])
+                for ocsf_event in ocsf_events
+            ]
             
-            # Process source entity if present
-            if "src" in ocsf_event:
-                src = ocsf_event["src"]
-                src_type = src.get("type", "Unknown")
-                src_query = f"""
-                MERGE (s:{src_type} {{id: $src_id}})
-                ON CREATE SET s += $src_props
-                WITH s
-                MATCH (e:Event) WHERE id(e) = toInteger($event_id)
-                CREATE (s)-[:GENERATED]->(e)
-                """
-                
-                src_params = {
-                    "src_id": src.get("id", str(hash(json.dumps(src)))),
-                    "src_props": {k: v for k, v in src.items() if k not in ["id", "type"]},
-                    "event_id": event_id
-                }
-                
-                db.execute_query(src_query, src_params)
+            # Key by source entity so each entity's events stay in order on one partition
+            partition_keys = [
+                entity_id(ocsf_event["src"]) if "src" in ocsf_event else ocsf_event.get("id")
+                for ocsf_event in ocsf_events
+            ]
             
-            # Process destination entity if present
-            if "dst" in ocsf_event:
-                dst = ocsf_event["dst"]
-                dst_type = dst.get("type", "Unknown")
-                dst_query = f"""
-                MERGE (d:{dst_type} {{id: $dst_id}})
-                ON CREATE SET d += $dst_props
-                WITH d
-                MATCH (e:Event) WHERE id(e) = toInteger($event_id)
-                CREATE (e)-[:TARGETS]->(d)
-                """
+            with phase("kafka_produce"):
+                success = producer.send_event_batch(kafka_messages, keys=partition_keys)
+            
+            if success:
+                # For Kafka mode, we generate a temporary ID since the actual DB ID will be created by the consumer
+                # In a production system, you might want to use a more robust ID generation strategy
+                responses = []
                 
-                dst_params = {
-                    "dst_id": dst.get("id", str(hash(json.dumps(dst)))),
-                    "dst_props": {k: v for k, v in dst.items() if k not in ["id", "type"]},
-                    "event_id": event_id
-                }
+                for ocsf_event in ocsf_events:
+                    temp_id = str(uuid.uuid4())
+                    log.info(f"Event sent to Kafka with temporary ID: {temp_id}")
+                    responses.append({"id": temp_id, "event": ocsf_event})
                 
-                db.execute_query(dst_query, dst_params)
-            
-            return EventResponse(id=event_id, event=ocsf_event)
+                return responses
+            else:
+                raise HTTPException(status_code=500, detail="Failed to send event to Kafka")
         else:
-            raise HTTPException(status_code=500, detail="Failed to create event")
+            log.warning("Kafka producer not available, falling back to direct database write")
+    
+    # If not using Kafka or Kafka producer not available, store directly in the database
+    with phase("graph_write"):
+        event_ids = _store_events(ocsf_events)
+    
+    return [
+        {"id": event_id, "event": ocsf_event}
+        for event_id, ocsf_event in zip(event_ids, ocsf_events)
+    ]
+
+
+@app.post("/events", response_model=EventResponse, status_code=status.HTTP_201_CREATED)
+async def create_event(event_data: EventCreate):
+    """
+    Create a new event.
+    
+    Args:
+        event_data: Event data to create
+        
+    Returns:
+        Created event
+    """
+    try:
+        events = await run_in_threadpool(_ingest_events, [event_data])
+        return events[0]
     
     except Exception as e:
         log.error(f"Failed to create event: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/events/batch", response_model=List[EventResponse], status_code=status.HTTP_201_CREATED)
+async def create_events(events_data: List[EventCreate]):
+    """
+    Create a batch of events.
+    
+    Args:
+        events_data: List of event data to create
+        
+    Returns:
+        List of created events, in the same order as the input
+    """
+    try:
+        return await run_in_threadpool(_ingest_events, events_data)
+    
+    except Exception as e:
+        log.error(f"Failed to create events: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.get("/events/{event_id}", response_model=EventResponse)
 async def get_event(event_id: str):
     """
@@ -458,12 +710,7 @@ async def get_event(event_id: str):
         Event
     """
     try:
-        query = """
-        MATCH (e:Event) WHERE id(e) = toInteger($event_id)
-        RETURN e
-        """
-        
-        result = db.execute_query(query, {"event_id": event_id})
+        result = await _execute_read_query(GET_EVENT_QUERY, {"event_id": event_id})
         
         if not result:
             raise HTTPException(status_code=404, detail=f"Event not found: {event_id}")
@@ -471,7 +718,7 @@ async def get_event(event_id: str):
         event_node = result[0]["e"]
         
         # Convert metadata from JSON string to dict
-        metadata = json.loads(event_node.get("metadata", "{}"))
+        metadata = json_loads(event_node.get("metadata", "{}"))
         
         event = {
             "class_uid": event_node.get("class_uid", "unknown"),
@@ -482,14 +729,104 @@ async def get_event(event_id: str):
             "metadata": metadata
         }
         
-        return EventResponse(id=event_id, event=event)
+        return {"id": event_id, "event": event}
     
     except Exception as e:
         log.error(f"Failed to get event: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.get("/alerts", response_model=List[AlertResponse])
+def _alert_from_record(record: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Convert an alert record with its collected entities to an alert response.
+    
+    Args:
+        record: Query record with the alert node and its entities
+        
+    Returns:
+        Alert response data
+    """
+    alert_node = record["a"]
+    entities = []
+    
+    for entity_record in record["entities"]:
+        entity = entity_record["e"]
+        entity_type = "Unknown"
+        
+        # Try to get the entity type from the labels result
+        if "labels" in entity_record and entity_record["labels"]:
+            entity_type = entity_record["labels"][0]
+        # Handle Neo4j node objects
+        elif hasattr(entity, "labels") and entity.labels:
+            entity_type = list(entity.labels)[0]
+        # Try to determine the entity type from the dictionary
+        elif "type" in entity:
+            entity_type = entity["type"]
+        elif "entity_type" in entity:
+            entity_type = entity["entity_type"]
+        
+        # Extract properties, excluding metadata fields
+        if hasattr(entity, "items"):
+            properties = {k: v for k, v in entity.items() if k not in ALERT_ENTITY_KEYS}
+        else:
+            properties = {}
+        
+        entities.append({
+            "type": entity_type,
+            "id": entity.get("id", "unknown"),
+            "properties": properties
+        })
+    
+    return {
+        "alert_id": alert_node["alert_id"],
+        "rule_id": alert_node["rule_id"],
+        "timestamp": alert_node["timestamp"],
+        "severity": alert_node["severity"],
+        "entities": entities,
+        "context": {}
+    }
+
+
+async def _stream_alerts(
+    first: Optional[Dict[str, Any]],
+    records: Generator[Dict[str, Any], None, None]
+) -> AsyncIterator[bytes]:
+    """
+    Encode alert records as a JSON array, one alert at a time.
+    
+    The records are read in worker threads. The record generator, and with it
+    the session streaming the query, is closed when the response ends, also
+    when the client disconnects mid-stream.
+    
+    Args:
+        first: First alert record, already read, or None if there are none
+        records: Remaining alert records as they are read from the database
+        
+    Yields:
+        Chunks of the JSON response body
+    """
+    try:
+        yield b"["
+        
+        record = first
+        index = 0
+        
+        while record is not None:
+            if index:
+                yield b","
+            yield orjson.dumps(_alert_from_record(record), default=str)
+            
+            index += 1
+            record = await run_in_threadpool(next, records, None)
+        
+        yield b"]"
+    finally:
+        await run_in_threadpool(records.close)
+
+
+# The response is streamed, so it is not validated against AlertResponse;
+# the model only documents its shape
+@app.get("/alerts", responses={200: {"model": List[AlertResponse], "description": "Alerts, streamed as a JSON array"}})
 async def get_alerts(
     severity: Optional[int] = Query(None, ge=1, le=10, description="Filter by severity"),
     rule_id: Optional[str] = Query(None, description="Filter by rule ID"),
@@ -498,6 +835,9 @@ async def get_alerts(
     """
     Get alerts.
     
+    Alerts are streamed to the client as they are read from the database, so
+    memory use does not grow with `limit`.
+    
     Args:
         severity: Filter by severity
         rule_id: Filter by rule ID
@@ -507,20 +847,8 @@ async def get_alerts(
         List of alerts
     """
     try:
-        # Build query
-        query = "MATCH (a:Alert)"
-        where_clauses = []
-        
-        if severity is not None:
-            where_clauses.append("a.severity = $severity")
-        
-        if rule_id is not None:
-            where_clauses.append("a.rule_id = $rule_id")
-        
-        if where_clauses:
-            query += " WHERE " + " AND ".join(where_clauses)
-        
-        query += " RETURN a ORDER BY a.timestamp DESC LIMIT $limit"
+        # Pick the prebuilt query for the filters in use
+        query = ALERTS_QUERIES[(severity is not None, rule_id is not None)]
         
         # Build parameters
         params = {"limit": limit}
@@ -531,64 +859,11 @@ async def get_alerts(
         if rule_id is not None:
             params["rule_id"] = rule_id
         
-        # Execute query
-        result = db.execute_query(query, params)
+        # Read the first record before responding, so query errors still return a 500
+        records = db.stream_query(query, params)
+        first = await run_in_threadpool(next, records, None)
         
-        # Convert to alerts
-        alerts = []
-        
-        for record in result:
-            alert_node = record["a"]
-            
-            # Get entities involved in the alert
-            entities_query = """
-            MATCH (a:Alert {alert_id: $alert_id})-[:INVOLVES]->(e)
-            RETURN e, labels(e) as labels
-            """
-            
-            entities_result = db.execute_query(entities_query, {"alert_id": alert_node["alert_id"]})
-            entities = []
-            
-            for entity_record in entities_result:
-                entity = entity_record["e"]
-                entity_type = "Unknown"
-                
-                # Try to get the entity type from the labels result
-                if "labels" in entity_record and entity_record["labels"]:
-                    entity_type = entity_record["labels"][0]
-                # Handle Neo4j node objects
-                elif hasattr(entity, "labels") and entity.labels:
-                    entity_type = list(entity.labels)[0]
-                # Try to determine the entity type from the dictionary
-                elif "type" in entity:
-                    entity_type = entity["type"]
-                elif "entity_type" in entity:
-                    entity_type = entity["entity_type"]
-                
-                # Extract properties, excluding metadata fields
-                if hasattr(entity, "items"):
-                    properties = {k: v for k, v in entity.items() if k not in ["id", "type", "entity_type"]}
-                else:
-                    properties = {}
-                
-                entities.append({
-                    "type": entity_type,
-                    "id": entity.get("id", "unknown"),
-                    "properties": properties
-                })
-            
-            alert = AlertResponse(
-                alert_id=alert_node["alert_id"],
-                rule_id=alert_node["rule_id"],
-                timestamp=alert_node["timestamp"],
-                severity=alert_node["severity"],
-                entities=entities,
-                context={}
-            )
-            
-            alerts.append(alert)
-        
-        return alerts
+        return StreamingResponse(_stream_alerts(first, records), media_type="application/json")
     
     except Exception as e:
         log.error(f"Failed to get alerts: {str(e)}")
@@ -599,52 +874,51 @@ async def get_alerts(
 async def execute_graph_query(request: GraphQueryRequest):
     """Execute a Neo4j query and return nodes and relationships."""
     try:
-        # Execute the query
-        result = db.execute_query(request.query)
+        # Execute the query, keeping Node and Relationship objects intact
+        result = await run_in_threadpool(db.execute_query_values, request.query)
         
-        # Log the raw result for debugging
-        log.info(f"Graph query result: {result}")
+        # The query may have written to the graph
+        query_cache.invalidate()
+        
+        log.debug(f"Graph query returned {len(result)} records")
         
         # Transform the result into nodes and relationships
         nodes = []
         relationships = []
+        nodes_append = nodes.append
+        relationships_append = relationships.append
         
-        for record in result:
-            log.info(f"Processing record: {record}")
-            for key, value in record.items():
-                log.info(f"Processing key: {key}, value type: {type(value)}")
-                
-                # Handle Neo4j Node objects
-                if hasattr(value, 'labels') and hasattr(value, 'items'):
-                    nodes.append({
+        for values in result:
+            for value in values:
+                if isinstance(value, Node):
+                    nodes_append({
                         "id": str(value.id),
                         "labels": list(value.labels),
                         "properties": dict(value)
                     })
-                # Handle Neo4j Relationship objects
-                elif hasattr(value, 'type') and hasattr(value, 'start_node') and hasattr(value, 'end_node'):
-                    relationships.append({
+                elif isinstance(value, Relationship):
+                    relationships_append({
                         "id": str(value.id),
                         "type": value.type,
                         "start": str(value.start_node.id),
                         "end": str(value.end_node.id),
                         "properties": dict(value)
                     })
-                # Handle dictionary values that might be nodes or relationships
+                # Handle map values shaped like nodes or relationships
                 elif isinstance(value, dict):
                     if 'labels' in value:
-                        nodes.append({
+                        nodes_append({
                             "id": str(value.get('id', '')),
                             "labels": value.get('labels', []),
-                            "properties": {k: v for k, v in value.items() if k not in ['id', 'labels']}
+                            "properties": {k: v for k, v in value.items() if k not in NODE_MAP_KEYS}
                         })
                     elif 'type' in value and 'start' in value and 'end' in value:
-                        relationships.append({
+                        relationships_append({
                             "id": str(value.get('id', '')),
                             "type": value['type'],
                             "start": str(value['start']),
                             "end": str(value['end']),
-                            "properties": {k: v for k, v in value.items() if k not in ['id', 'type', 'start', 'end']}
+                            "properties": {k: v for k, v in value.items() if k not in RELATIONSHIP_MAP_KEYS}
                         })
         
         return {
@@ -662,12 +936,30 @@ async def startup_event():
     """Startup event handler."""
     log.info("Starting Blueprint Graph API")
     
+    # Create the indexes rule queries seek on before their plans are cached
+    await run_in_threadpool(create_indexes)
+    
     # Load detection rules
     rules_file = os.path.join("config", "detection_rules.json")
     if os.path.exists(rules_file):
         detection_engine.load_rules_from_file(rules_file)
     else:
         log.warning(f"Detection rules file not found: {rules_file}")
+    
+    # Compile rule queries up front so the first detection run skips query planning
+    rules = list(detection_engine.rules.values())
+    start = time.perf_counter()
+    compiled = await _gather_bounded(detection_engine.prepare_rule, rules, limit=8)
+    log.info(f"startup_profile: compiled {sum(compiled)}/{len(rules)} rule queries in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Shutdown event handler."""
+    log.info("Stopping Blueprint Graph API")
+    
+    # Deliver any messages still queued on the Kafka producer
+    await run_in_threadpool(close_producer)
 
 
 if __name__ == "__main__":
@@ -2,5 +2,6 @@
 Core modules for the detection engine.
 """
 from .detection_engine import DetectionRule, DetectionAlert, detection_engine
+from .event_store import store_events, create_indexes
 
-__all__ = ["DetectionRule", "DetectionAlert", "detection_engine"] 
\ No newline at end of file
+__all__ = ["DetectionRule", "DetectionAlert", "detection_engine", "store_events", "create_indexes"] 
\ No newline at end of file
@@ -4,11 +4,42 @@ Core detection engine module.
 This module provides the main detection engine functionality for identifying security threats
 based on graph patterns in the Neo4j database.
 """
-from typing import Dict, Any, List, Optional
-from src.utils import db, log
+import os
+import time
+import uuid
+import itertools
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from types import MappingProxyType
+from typing import Dict, Any, List, Mapping, NamedTuple, Optional
+from src.utils import db, log, settings, json_loads
 from src.schemas import ocsf_schema
 
 
+# Query storing a batch of alerts with links to the entities they involve.
+# Missing entities are created through apoc.merge.node, which takes the label
+# as a parameter so one statement covers every entity type.
+STORE_ALERTS_QUERY = """
+UNWIND $rows AS al
+CREATE (a:Alert {
+    alert_id: al.alert_id,
+    rule_id: al.rule_id,
+    timestamp: al.timestamp,
+    severity: al.severity
+})
+WITH a, al
+CALL {
+    WITH a, al
+    UNWIND al.entities AS ent
+    CALL apoc.merge.node([ent.type], {id: ent.id}, ent.properties, {}) YIELD node
+    CREATE (a)-[:INVOLVES]->(node)
+}
+RETURN count(a) AS stored
+"""
+
+
 class DetectionRule:
     """
     Detection rule class.
@@ -26,7 +57,8 @@ class DetectionRule:
         query: str,
         tags: List[str] = None,
         mitre_techniques: List[str] = None,
-        enabled: bool = True
+        enabled: bool = True,
+        parameters: Dict[str, Any] = None
     ):
         """
         Initialize a detection rule.
@@ -40,6 +72,7 @@ class DetectionRule:
             tags (list, optional): List of tags for categorization
             mitre_techniques (list, optional): List of MITRE ATT&CK techniques
             enabled (bool, optional): Whether the rule is enabled
+            parameters (dict, optional): Values of the query's $parameters
         """
         self.rule_id = rule_id
         self.name = name
@@ -49,6 +82,7 @@ class DetectionRule:
         self.tags = tags or []
         self.mitre_techniques = mitre_techniques or []
         self.enabled = enabled
+        self.parameters = parameters or {}
     
     def to_dict(self) -> Dict[str, Any]:
         """
@@ -65,7 +99,8 @@ class DetectionRule:
             "query": self.query,
             "tags": self.tags,
             "mitre_techniques": self.mitre_techniques,
-            "enabled": self.enabled
+            "enabled": self.enabled,
+            "parameters": self.parameters
         }
     
     @classmethod
@@ -87,7 +122,8 @@ class DetectionRule:
             query=data["query"],
             tags=data.get("tags", []),
             mitre_techniques=data.get("mitre_techniques", []),
-            enabled=data.get("enabled", True)
+            enabled=data.get("enabled", True),
+            parameters=data.get("parameters", {})
         )
 
 
@@ -162,6 +198,28 @@ class DetectionAlert:
         )
 
 
+class _RuleSnapshot(NamedTuple):
+    """Immutable set of rules with their tag and enabled indexes."""
+    rules: Mapping[str, DetectionRule]
+    # Rule IDs in load order; dict keys are used as ordered sets
+    by_tag: Mapping[str, Dict[str, None]]
+    enabled: Dict[str, None]
+    
+    @classmethod
+    def build(cls, rules: Dict[str, DetectionRule]) -> '_RuleSnapshot':
+        """Index a set of rules."""
+        by_tag = defaultdict(dict)
+        enabled = {}
+        
+        for rule_id, rule in rules.items():
+            for tag in rule.tags:
+                by_tag[tag][rule_id] = None
+            if rule.enabled:
+                enabled[rule_id] = None
+        
+        return cls(MappingProxyType(rules), MappingProxyType(dict(by_tag)), enabled)
+
+
 class DetectionEngine:
     """
     Detection engine class.
@@ -171,52 +229,168 @@ class DetectionEngine:
     
     def __init__(self):
         """Initialize the detection engine."""
-        self.rules = {}
+        # Rules and their indexes are replaced together on every change, so
+        # readers always see a consistent snapshot without taking a lock
+        self._snapshot = _RuleSnapshot.build({})
+        self._write_lock = threading.Lock()
+    
+    @property
+    def rules(self) -> Mapping[str, DetectionRule]:
+        """Read-only view of the loaded rules by ID."""
+        return self._snapshot.rules
+    
+    def _replace_rules(self, rules: Dict[str, DetectionRule]) -> None:
+        """Publish a new set of rules to readers."""
+        self._snapshot = _RuleSnapshot.build(rules)
     
     def load_rule(self, rule: DetectionRule) -> None:
         """
-        Load a detection rule.
+        Load a detection rule, replacing any rule with the same ID.
         
         Args:
             rule (DetectionRule): The rule to load
         """
-        self.rules[rule.rule_id] = rule
+        with self._write_lock:
+            self._replace_rules({**self._snapshot.rules, rule.rule_id: rule})
         log.info(f"Loaded detection rule: {rule.name} ({rule.rule_id})")
     
-    def load_rules_from_file(self, file_path: str) -> None:
+    def remove_rule(self, rule_id: str) -> bool:
+        """
+        Remove a detection rule.
+        
+        Args:
+            rule_id (str): ID of the rule to remove
+            
+        Returns:
+            bool: True if the rule was removed, False if it was not loaded
+        """
+        with self._write_lock:
+            rules = dict(self._snapshot.rules)
+            if rules.pop(rule_id, None) is None:
+                return False
+            self._replace_rules(rules)
+        return True
+    
+    def clear_rules(self) -> None:
+        """Remove all detection rules."""
+        with self._write_lock:
+            self._replace_rules({})
+    
+    def find_rules(self, enabled: Optional[bool] = None, tag: Optional[str] = None) -> List[DetectionRule]:
         """
-        Load detection rules from a JSON file.
+        Find rules by enabled status and tag using the rule indexes.
         
         Args:
-            file_path (str): Path to the JSON file containing rules
+            enabled (bool, optional): Filter by enabled status
+            tag (str, optional): Filter by tag
+            
+        Returns:
+            list: Matching detection rules, in load order
+        """
+        snapshot = self._snapshot
+        
+        if tag is not None:
+            rule_ids = snapshot.by_tag.get(tag, ())
+            if enabled is True:
+                rule_ids = [rule_id for rule_id in rule_ids if rule_id in snapshot.enabled]
+            elif enabled is False:
+                rule_ids = [rule_id for rule_id in rule_ids if rule_id not in snapshot.enabled]
+        elif enabled is True:
+            rule_ids = snapshot.enabled
+        elif enabled is False:
+            rule_ids = [rule_id for rule_id in snapshot.rules if rule_id not in snapshot.enabled]
+        else:
+            return list(snapshot.rules.values())
+        
+        return [snapshot.rules[rule_id] for rule_id in rule_ids]
+    
+    def load_rules_from_file(self, file_path: str) -> None:
         """
-        import json
-        import os
+        Load detection rules from a JSON or JSON Lines file.
+        
+        A ".jsonl" file holds one rule per line and is read a line at a time,
+        so large rule files are never held in memory as a whole. Any other
+        file holds a JSON array of rules.
         
+        Args:
+            file_path (str): Path to the file containing rules
+        """
         if not os.path.exists(file_path):
             log.error(f"Rules file not found: {file_path}")
             return
         
         try:
-            with open(file_path, 'r') as f:
-                rules_data = json.load(f)
-            
-            # Clear existing rules if loading from a file
-            self.rules = {}
+            with open(file_path, 'rb') as f:
+                if file_path.endswith('.jsonl'):
+                    rules_data = (json_loads(line) for line in f if line.strip())
+                else:
+                    rules_data = json_loads(f.read())
+                
+                # Loading from a file replaces the existing rules
+                rules = {}
+                count = 0
+                
+                for rule_data in rules_data:
+                    rule = DetectionRule.from_dict(rule_data)
+                    rules[rule.rule_id] = rule
+                    count += 1
+                    log.info(f"Loaded detection rule: {rule.name} ({rule.rule_id})")
             
-            # Load each rule
-            for rule_data in rules_data:
-                rule = DetectionRule.from_dict(rule_data)
-                self.load_rule(rule)
+            with self._write_lock:
+                self._replace_rules(rules)
             
-            log.info(f"Loaded {len(rules_data)} rules from {file_path}")
+            log.info(f"Loaded {count} rules from {file_path}")
         except Exception as e:
             log.error(f"Failed to load rules from {file_path}: {str(e)}")
     
+    def compile_rule(self, rule: DetectionRule) -> float:
+        """
+        Compile a rule's query with EXPLAIN without running it.
+        
+        This populates the Neo4j query plan cache so the first detection run
+        does not pay the planning cost.
+        
+        Args:
+            rule (DetectionRule): The rule to compile
+            
+        Returns:
+            float: Time taken to compile the query in seconds
+            
+        Raises:
+            neo4j.exceptions.ClientError: If the query is invalid
+        """
+        start = time.perf_counter()
+        db.execute_query(f"EXPLAIN {rule.query}", rule.parameters)
+        return time.perf_counter() - start
+    
+    def prepare_rule(self, rule: DetectionRule) -> bool:
+        """
+        Compile a rule's query, logging rather than raising on failure.
+        
+        Args:
+            rule (DetectionRule): The rule to prepare
+            
+        Returns:
+            bool: True if the query compiled, False otherwise
+        """
+        try:
+            elapsed = self.compile_rule(rule)
+        except Exception as e:
+            log.error(f"Failed to compile query for rule {rule.rule_id}: {str(e)}")
+            return False
+        
+        log.info(f"startup_profile: compiled rule {rule.rule_id} in {elapsed * 1000:.1f} ms")
+        return True
+    
     def run_detection(self, rule_id: Optional[str] = None) -> List[DetectionAlert]:
         """
         Run detection using the specified rule or all rules.
         
+        When running all rules, their queries are independent and run
+        concurrently, up to settings.detection_concurrency at a time, each
+        worker thread using its own session from the shared driver and
+        closing it before the thread exits.
+        
         Args:
             rule_id (str, optional): ID of the rule to run, or None to run all rules
             
@@ -226,23 +400,47 @@ class DetectionEngine:
         alerts = []
         
         if rule_id:
-            if rule_id not in self.rules:
+            rule = self.rules.get(rule_id)
+            if rule is None:
                 log.error(f"Rule not found: {rule_id}")
                 return []
             
-            rule = self.rules[rule_id]
             if not rule.enabled:
                 log.warning(f"Rule is disabled: {rule_id}")
                 return []
             
             alerts.extend(self._run_rule(rule))
         else:
-            for rule in self.rules.values():
-                if rule.enabled:
+            rules = self.find_rules(enabled=True)
+            
+            if len(rules) <= 1:
+                for rule in rules:
                     alerts.extend(self._run_rule(rule))
+            else:
+                # Results are collected in rule order, as when running sequentially
+                with ThreadPoolExecutor(max_workers=min(settings.detection_concurrency, len(rules))) as executor:
+                    alerts.extend(itertools.chain.from_iterable(executor.map(self._run_rule_in_worker, rules)))
         
         return alerts
     
+    def _run_rule_in_worker(self, rule: DetectionRule) -> List[DetectionAlert]:
+        """
+        Run a single detection rule in a short-lived worker thread.
+        
+        The worker's thread session is closed afterwards, as the thread does
+        not outlive the run.
+        
+        Args:
+            rule (DetectionRule): The rule to run
+            
+        Returns:
+            list: List of detection alerts
+        """
+        try:
+            return self._run_rule(rule)
+        finally:
+            db.close_thread_session()
+    
     def _run_rule(self, rule: DetectionRule) -> List[DetectionAlert]:
         """
         Run a single detection rule.
@@ -253,14 +451,12 @@ class DetectionEngine:
         Returns:
             list: List of detection alerts
         """
-        import uuid
-        from datetime import datetime
-        
         alerts = []
         
         try:
-            # Execute the rule's Cypher query
-            results = db.execute_query(rule.query)
+            # Execute the rule's Cypher query. Values are passed as parameters, so
+            # rules differing only in thresholds or class IDs share one query plan
+            results = db.execute_query(rule.query, rule.parameters)
             
             if not results:
                 return []
@@ -284,9 +480,7 @@ class DetectionEngine:
                         entity_id = value.get('id', str(value.id))
                         
                         # Convert node properties to a dictionary
-                        properties = {}
-                        for k, v in value.items():
-                            properties[k] = v
+                        properties = dict(value.items())
                         
                         entities.append({
                             "type": entity_type,
@@ -304,6 +498,9 @@ class DetectionEngine:
                             "properties": value
                         })
                 
+                # Convert to string to ensure serializable
+                raw_result = {k: str(v) for k, v in result.items()}
+                
                 # If no entities were extracted but we have results, create a generic entity
                 if not entities and result:
                     # Use the first key as the entity type
@@ -311,7 +508,7 @@ class DetectionEngine:
                     entities.append({
                         "type": first_key.capitalize(),
                         "id": str(uuid.uuid4()),
-                        "properties": {k: str(v) for k, v in result.items()}
+                        "properties": raw_result
                     })
                 
                 alert = DetectionAlert(
@@ -320,21 +517,52 @@ class DetectionEngine:
                     timestamp=timestamp,
                     severity=rule.severity,
                     entities=entities,
-                    context={"raw_result": {k: str(v) for k, v in result.items()}}  # Convert to string to ensure serializable
+                    context={"raw_result": raw_result}
                 )
                 
                 alerts.append(alert)
-                log.info(f"Generated alert {alert_id} from rule {rule.rule_id}")
+                log.debug("Generated alert {} from rule {}", alert_id, rule.rule_id)
+            
+            log.info(f"Generated {len(alerts)} alerts from rule {rule.rule_id}")
         
         except Exception as e:
             log.error(f"Error running rule {rule.rule_id}: {str(e)}")
         
         return alerts
     
+    def _alert_params(self, alert: DetectionAlert) -> Dict[str, Any]:
+        """
+        Build the STORE_ALERTS_QUERY parameters of an alert.
+        
+        Args:
+            alert (DetectionAlert): The alert
+            
+        Returns:
+            dict: Alert properties and involved entities
+        """
+        return {
+            "alert_id": alert.alert_id,
+            "rule_id": alert.rule_id,
+            "timestamp": alert.timestamp,
+            "severity": alert.severity,
+            "entities": [
+                {
+                    "type": entity.get("type", "Unknown"),
+                    "id": entity.get("id", "unknown"),
+                    "properties": entity.get("properties", {})
+                }
+                for entity in alert.entities
+            ]
+        }
+    
     def store_alert(self, alert: DetectionAlert) -> bool:
         """
         Store an alert in the database.
         
+        The alert and its entities are written with one query. Entity labels
+        are passed as parameters, so the query text never changes with the
+        entity types and Neo4j reuses one cached plan.
+        
         Args:
             alert (DetectionAlert): The alert to store
             
@@ -342,82 +570,7 @@ class DetectionEngine:
             bool: True if successful, False otherwise
         """
         try:
-            # Create an Alert node in Neo4j
-            query = """
-            CREATE (a:Alert {
-                alert_id: $alert_id,
-                rule_id: $rule_id,
-                timestamp: $timestamp,
-                severity: $severity
-            })
-            RETURN a
-            """
-            
-            params = {
-                "alert_id": alert.alert_id,
-                "rule_id": alert.rule_id,
-                "timestamp": alert.timestamp,
-                "severity": alert.severity
-            }
-            
-            result = db.execute_query(query, params)
-            
-            if not result:
-                log.error(f"Failed to create Alert node for {alert.alert_id}")
-                return False
-            
-            # For each entity in the alert, create a relationship to the Alert node
-            for entity in alert.entities:
-                entity_type = entity.get("type", "Unknown")
-                entity_id = entity.get("id", "unknown")
-                
-                # First check if the entity exists
-                check_query = f"""
-                MATCH (e:{entity_type} {{id: $entity_id}})
-                RETURN e
-                """
-                
-                check_params = {
-                    "entity_id": entity_id
-                }
-                
-                entity_exists = db.execute_query(check_query, check_params)
-                
-                if entity_exists:
-                    # Create relationship if entity exists
-                    entity_query = f"""
-                    MATCH (a:Alert {{alert_id: $alert_id}})
-                    MATCH (e:{entity_type} {{id: $entity_id}})
-                    CREATE (a)-[:INVOLVES]->(e)
-                    RETURN a, e
-                    """
-                    
-                    entity_params = {
-                        "alert_id": alert.alert_id,
-                        "entity_id": entity_id
-                    }
-                    
-                    db.execute_query(entity_query, entity_params)
-                else:
-                    # Create the entity if it doesn't exist
-                    properties = entity.get("properties", {})
-                    properties_str = ", ".join([f"{k}: ${k}" for k in properties.keys()])
-                    
-                    create_query = f"""
-                    MATCH (a:Alert {{alert_id: $alert_id}})
-                    CREATE (e:{entity_type} {{id: $entity_id, {properties_str}}})
-                    CREATE (a)-[:INVOLVES]->(e)
-                    RETURN a, e
-                    """
-                    
-                    create_params = {
-                        "alert_id": alert.alert_id,
-                        "entity_id": entity_id,
-                        **properties
-                    }
-                    
-                    db.execute_query(create_query, create_params)
-            
+            db.execute_many(STORE_ALERTS_QUERY, [self._alert_params(alert)])
             log.info(f"Stored alert {alert.alert_id} in the database")
             return True
         
@@ -425,6 +578,30 @@ class DetectionEngine:
             log.error(f"Failed to store alert {alert.alert_id}: {str(e)}")
             return False
 
+    def store_alerts_bulk(self, alerts: List[DetectionAlert]) -> bool:
+        """
+        Store a batch of alerts in the database with a single query.
+        
+        Args:
+            alerts (list): The alerts to store
+            
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        if not alerts:
+            return True
+        
+        rows = [self._alert_params(alert) for alert in alerts]
+        
+        try:
+            db.execute_many(STORE_ALERTS_QUERY, rows)
+            log.info(f"Stored {len(alerts)} alerts in the database")
+            return True
+        
+        except Exception as e:
+            log.error(f"Failed to store {len(alerts)} alerts: {str(e)}")
+            return False
+
 
 # Create a global detection engine instance
 detection_engine = DetectionEngine() 
\ No newline at end of file
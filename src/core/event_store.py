@@ -0,0 +1,167 @@
+"""
+Event storage module.
+
+This module writes OCSF events and the entities they involve to the Neo4j
+graph database. The API, the Kafka consumer and the ingestion pipeline all
+store events through it.
+"""
+from typing import Dict, Any, List
+from src.utils import db, log, json_dumps, entity_id
+
+
+# Query storing a batch of events with their source, destination and principal
+# entities. Each distinct entity in the batch is merged once, then linked to
+# every event that references it by key. Entity labels are passed as parameters
+# through apoc.merge.node, so the query text is the same for every batch and
+# Neo4j reuses one cached plan.
+STORE_EVENTS_QUERY = """
+UNWIND $entities AS ent
+CALL apoc.merge.node([ent.type], {id: ent.id}, ent.props, {}) YIELD node
+WITH apoc.map.fromPairs(collect([ent.key, node])) AS entities
+UNWIND $events AS ev
+CREATE (e:Event {
+    class_uid: ev.class_uid,
+    category_uid: ev.category_uid,
+    time: ev.time,
+    severity: ev.severity,
+    message: ev.message,
+    metadata: ev.metadata
+})
+WITH e, ev, entities
+CALL {
+    WITH e, ev, entities
+    WITH e, entities[ev.src] AS s WHERE s IS NOT NULL
+    CREATE (s)-[:GENERATED]->(e)
+}
+CALL {
+    WITH e, ev, entities
+    WITH e, entities[ev.dst] AS d WHERE d IS NOT NULL
+    CREATE (e)-[:TARGETS]->(d)
+}
+CALL {
+    WITH e, ev, entities
+    WITH e, entities[ev.principal] AS p WHERE p IS NOT NULL
+    CREATE (p)-[:PERFORMED]->(e)
+}
+RETURN ev.index AS index, id(e) AS id
+"""
+
+# Indexes on the Event properties detection rules filter on. Rules start
+# their match from an index seek on these instead of scanning every Event and
+# expanding its relationships, so a rule whose classes have no events costs
+# almost nothing.
+EVENT_INDEX_QUERIES = [
+    "CREATE INDEX event_class_uid IF NOT EXISTS FOR (e:Event) ON (e.class_uid)",
+    "CREATE INDEX event_class_category IF NOT EXISTS FOR (e:Event) ON (e.class_uid, e.category_uid)"
+]
+
+# Entity fields of an OCSF event and the label used when an entity has no type
+ENTITY_FIELDS = {
+    "src": "Unknown",
+    "dst": "Unknown",
+    "principal": "User"
+}
+
+# Entity labels stored by events and alerts. Entities are merged by label and
+# id, so each label gets an index on id; without one every merge scans all
+# nodes of the label. These are range indexes rather than uniqueness
+# constraints, so existing graphs with duplicate ids can still be indexed.
+ENTITY_INDEX_LABELS = ["IP", "Host", "User", "Process", "Unknown"]
+
+INDEX_QUERIES = EVENT_INDEX_QUERIES + [
+    f"CREATE INDEX entity_{label.lower()}_id IF NOT EXISTS FOR (n:{label}) ON (n.id)"
+    for label in ENTITY_INDEX_LABELS
+]
+
+# Entity keys that are stored as the node label and identity, not as properties
+ENTITY_KEY_FIELDS = frozenset(["id", "type"])
+
+
+def store_events(ocsf_events: List[Dict[str, Any]], session=None) -> List[str]:
+    """
+    Store OCSF events in the graph database.
+
+    The whole batch, including source, destination and principal entities,
+    is written with a single UNWIND query in one transaction instead of up to
+    four queries per event. Entities shared by several events in the batch
+    are merged only once.
+
+    Args:
+        ocsf_events (list): OCSF events to store
+        session (neo4j.Session, optional): Open session to write in; a new
+            session is used if not given
+
+    Returns:
+        list: Database IDs of the events, in the same order as the input
+
+    Raises:
+        RuntimeError: If any event was not created
+    """
+    if not ocsf_events:
+        return []
+
+    # Distinct entities in the batch by (type, id); the first occurrence
+    # provides the properties of a newly created entity, as MERGE would
+    entities = {}
+
+    def entity_key(entity: Dict[str, Any], default_type: str) -> str:
+        identity = (entity.get("type", default_type), entity_id(entity))
+
+        if identity not in entities:
+            entities[identity] = {
+                "key": str(len(entities)),
+                "type": identity[0],
+                "id": identity[1],
+                "props": {k: v for k, v in entity.items() if k not in ENTITY_KEY_FIELDS}
+            }
+
+        return entities[identity]["key"]
+
+    rows = []
+
+    for index, ocsf_event in enumerate(ocsf_events):
+        row = {
+            "index": index,
+            "class_uid": ocsf_event.get("class_uid", "unknown"),
+            "category_uid": ocsf_event.get("category_uid", "unknown"),
+            "time": ocsf_event.get("time", ""),
+            "severity": ocsf_event.get("severity", 0),
+            "message": ocsf_event.get("message", ""),
+            "metadata": json_dumps(ocsf_event.get("metadata") or {})
+        }
+
+        # Process entities if present
+        for field, default_type in ENTITY_FIELDS.items():
+            row[field] = entity_key(ocsf_event[field], default_type) if field in ocsf_event else None
+
+        rows.append(row)
+
+    params = {"entities": list(entities.values()), "events": rows}
+    result = db.execute_write(STORE_EVENTS_QUERY, params, session=session)
+
+    event_ids = [None] * len(ocsf_events)
+
+    for record in result:
+        event_ids[record["index"]] = str(record["id"])
+
+    if any(event_id is None for event_id in event_ids):
+        raise RuntimeError("Failed to create events in the graph database")
+
+    return event_ids
+
+
+def create_indexes() -> bool:
+    """
+    Create the Event and entity indexes if they do not exist.
+
+    Returns:
+        bool: True if all indexes exist, False otherwise
+    """
+    try:
+        for query in INDEX_QUERIES:
+            db.execute_query(query)
+    except Exception as e:
+        log.error(f"Failed to create graph indexes: {str(e)}")
+        return False
+
+    return True
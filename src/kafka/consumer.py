@@ -3,14 +3,14 @@ Kafka consumer module for Blueprint Graph.
 
 This module provides a Kafka consumer for processing events from Kafka topics.
 """
-import json
 import time
 import signal
 import sys
 from typing import Dict, Any, Optional, List, Callable
 from confluent_kafka import Consumer, KafkaError
-from src.utils import settings, log, db
+from src.utils import settings, log, json_loads
 from src.schemas import ocsf_schema
+from src.core import store_events, create_indexes
 
 
 class KafkaConsumer:
@@ -52,7 +52,11 @@ class KafkaConsumer:
             'group.id': self.group_id,
             'auto.offset.reset': self.auto_offset_reset,
             'enable.auto.commit': True,
-            'auto.commit.interval.ms': 5000
+            'auto.commit.interval.ms': 5000,
+            # Fetch in large batches rather than many small requests
+            'fetch.wait.max.ms': settings.kafka_fetch_wait_max_ms,
+            'fetch.min.bytes': settings.kafka_fetch_min_bytes,
+            'queued.max.messages.kbytes': settings.kafka_queued_max_messages_kbytes
         })
         
         log.info(f"Initialized Kafka consumer with bootstrap servers: {self.bootstrap_servers}")
@@ -80,30 +84,36 @@ class KafkaConsumer:
         # Process events
         try:
             while self.running:
-                msg = self.consumer.poll(1.0)
+                # Fetch up to a batch of messages per call
+                msgs = self.consumer.consume(num_messages=settings.kafka_consume_batch_size, timeout=1.0)
+                events = []
                 
-                if msg is None:
+                for msg in msgs:
+                    if msg.error():
+                        if msg.error().code() == KafkaError._PARTITION_EOF:
+                            log.debug(f"Reached end of partition {msg.partition()}")
+                        else:
+                            log.error(f"Kafka error: {msg.error()}")
+                        continue
+                    
+                    try:
+                        # Parse the message value; orjson reads the bytes directly
+                        events.append(json_loads(msg.value()))
+                    except Exception as e:
+                        log.error(f"Failed to parse message: {str(e)}")
+                
+                if not events:
                     continue
                 
-                if msg.error():
-                    if msg.error().code() == KafkaError._PARTITION_EOF:
-                        log.debug(f"Reached end of partition {msg.partition()}")
-                    else:
-                        log.error(f"Kafka error: {msg.error()}")
-                else:
-                    try:
-                        # Parse the message value
-                        value = msg.value().decode('utf-8')
-                        event = json.loads(value)
-                        
-                        # Process the event
-                        if process_func:
+                # Process the events
+                if process_func:
+                    for event in events:
+                        try:
                             process_func(event)
-                        else:
-                            self.process_event(event)
-                            
-                    except Exception as e:
-                        log.error(f"Failed to process message: {str(e)}")
+                        except Exception as e:
+                            log.error(f"Failed to process message: {str(e)}")
+                else:
+                    self.process_batch(events)
         
         except Exception as e:
             log.error(f"Error in Kafka consumer: {str(e)}")
@@ -118,92 +128,43 @@ class KafkaConsumer:
         Args:
             event: Event data to process
         """
+        self.process_batch([event])
+    
+    def process_batch(self, events: List[Dict[str, Any]]):
+        """
+        Process a batch of events from Kafka with a single database write.
+        
+        Args:
+            events: Event data to process
+        """
         try:
-            log.debug(f"Processing event: {event}")
+            mapper = ocsf_schema.map_to_ocsf
+            ocsf_events = []
+            append = ocsf_events.append
             
-            # Extract event data and source format
-            event_data = event.get('event', {})
-            source_format = event.get('source_format', 'unknown')
-            
-            # Map to OCSF if not already in OCSF format
-            if source_format != "ocsf":
-                ocsf_event = ocsf_schema.map_to_ocsf(event_data, source_format)
-            else:
-                ocsf_event = event_data
-            
-            # Store in graph database
-            query = """
-            CREATE (e:Event {
-                class_uid: $class_uid,
-                category_uid: $category_uid,
-                time: $time,
-                severity: $severity,
-                message: $message,
-                metadata: $metadata
-            })
-            RETURN id(e) as id
-            """
-            
-            params = {
-                "class_uid": ocsf_event.get("class_uid", "unknown"),
-                "category_uid": ocsf_event.get("category_uid", "unknown"),
-                "time": ocsf_event.get("time", ""),
-                "severity": ocsf_event.get("severity", 0),
-                "message": ocsf_event.get("message", ""),
-                "metadata": json.dumps(ocsf_event.get("metadata", {}))
-            }
+            for event in events:
+                # Extract event data and source format
+                event_data = event.get('event', {})
+                source_format = event.get('source_format', 'unknown')
+                
+                # Map to OCSF if not already in OCSF format
+                if source_format != "ocsf":
+                    append(mapper(event_data, source_format))
+                else:
+                    append(event_data)
             
-            result = db.execute_query(query, params)
+            # Store the whole batch in the graph database in one transaction
+            event_ids = store_events(ocsf_events)
             
-            if result and len(result) > 0:
-                event_id = str(result[0]["id"])
-                
-                # Process source entity if present
-                if "src" in ocsf_event:
-                    src = ocsf_event["src"]
-                    src_type = src.get("type", "Unknown")
-                    src_query = f"""
-                    MERGE (s:{src_type} {{id: $src_id}})
-                    ON CREATE SET s += $src_props
-                    WITH s
-                    MATCH (e:Event) WHERE id(e) = toInteger($event_id)
-                    CREATE (s)-[:GENERATED]->(e)
-                    """
-                    
-                    src_params = {
-                        "src_id": src.get("id", str(hash(json.dumps(src)))),
-                        "src_props": {k: v for k, v in src.items() if k not in ["id", "type"]},
-                        "event_id": event_id
-                    }
-                    
-                    db.execute_query(src_query, src_params)
-                
-                # Process destination entity if present
-                if "dst" in ocsf_event:
-                    dst = ocsf_event["dst"]
-                    dst_type = dst.get("type", "Unknown")
-                    dst_query = f"""
-                    MERGE (d:{dst_type} {{id: $dst_id}})
-                    ON CREATE SET d += $dst_props
-                    WITH d
-                    MATCH (e:Event) WHERE id(e) = toInteger($event_id)
-                    CREATE (e)-[:TARGETS]->(d)
-                    """
-                    
-                    dst_params = {
-                        "dst_id": dst.get("id", str(hash(json.dumps(dst)))),
-                        "dst_props": {k: v for k, v in dst.items() if k not in ["id", "type"]},
-                        "event_id": event_id
-                    }
-                    
-                    db.execute_query(dst_query, dst_params)
-                
-                log.info(f"Successfully processed event with ID: {event_id}")
-            else:
-                log.error("Failed to create event in database")
+            log.info(f"Successfully processed {len(event_ids)} events")
         
         except Exception as e:
-            log.error(f"Failed to process event: {str(e)}")
+            log.error(f"Failed to process batch of {len(events)} events: {str(e)}")
+            
+            # Retry one by one so a single bad event does not drop the whole batch
+            if len(events) > 1:
+                for event in events:
+                    self.process_batch([event])
     
     def _signal_handler(self, sig, frame):
         """
@@ -227,6 +188,10 @@ def main():
     """Main entry point for the Kafka consumer."""
     try:
         log.info("Starting Kafka consumer...")
+        
+        # Entities are merged by id, so make sure those lookups are indexed
+        create_indexes()
+        
         consumer = KafkaConsumer()
         consumer.start()
     except Exception as e:
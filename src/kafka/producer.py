@@ -3,8 +3,11 @@ Kafka producer module for Blueprint Graph.
 
 This module provides a Kafka producer for sending events to Kafka topics.
 """
-import json
-from typing import Dict, Any, Optional
+import threading
+from concurrent.futures import Future, wait
+from functools import partial
+from typing import Dict, Any, List, Optional
+import orjson
 from confluent_kafka import Producer
 from src.utils import settings, log
 
@@ -29,48 +32,135 @@ class KafkaProducer:
         self.producer = Producer({
             'bootstrap.servers': self.bootstrap_servers,
             'client.id': 'blueprintgraph-producer',
-            'acks': 'all'
+            'acks': 'all',
+            'enable.idempotence': True,
+            # Let messages from concurrent requests share broker requests
+            'linger.ms': settings.kafka_linger_ms,
+            'batch.size': settings.kafka_batch_size,
+            'batch.num.messages': settings.kafka_batch_num_messages,
+            'compression.type': settings.kafka_compression_type
         })
         
+        # Serve delivery callbacks in the background, so senders only wait for their own messages
+        self._closed = threading.Event()
+        self._poll_thread = threading.Thread(target=self._poll_loop, name='kafka-producer-poll', daemon=True)
+        self._poll_thread.start()
+        
         log.info(f"Initialized Kafka producer with bootstrap servers: {self.bootstrap_servers}")
     
-    def send_event(self, event: Dict[str, Any], topic: Optional[str] = None) -> bool:
+    def send_event(self, event: Dict[str, Any], topic: Optional[str] = None, key: Optional[str] = None) -> bool:
         """
         Send an event to a Kafka topic.
         
         Args:
             event: Event data to send
             topic: Topic to send the event to (defaults to self.topic)
+            key: Partition key; events with the same key keep their order
             
         Returns:
             bool: True if the event was sent successfully, False otherwise
         """
+        return self.send_event_batch([event], topic, keys=[key])
+
+    def send_event_batch(
+        self,
+        events: List[Dict[str, Any]],
+        topic: Optional[str] = None,
+        timeout: float = 10,
+        keys: Optional[List[Optional[str]]] = None
+    ) -> bool:
+        """
+        Send a batch of events to a Kafka topic.
+
+        The events are queued on the producer and sent in batches shared with
+        other callers; this waits for the delivery reports of these events only,
+        rather than flushing the whole producer queue.
+
+        Args:
+            events: List of event data to send
+            topic: Topic to send the events to (defaults to self.topic)
+            timeout: Maximum time to wait for delivery in seconds
+            keys: Partition key for each event; events with the same key keep their order
+
+        Returns:
+            bool: True if all events were sent successfully, False otherwise
+
+        Raises:
+            ValueError: If keys are given but not one per event
+        """
+        if keys is not None and len(keys) != len(events):
+            raise ValueError(f"Got {len(keys)} keys for {len(events)} events")
+
         try:
-            # Convert event to JSON string
-            event_json = json.dumps(event)
-            
             # Use the provided topic or the default topic
             target_topic = topic or self.topic
-            
+
             if not target_topic:
-                raise ValueError("No topic specified for sending event")
-            
-            # Send the event to Kafka
-            self.producer.produce(
-                topic=target_topic,
-                value=event_json.encode('utf-8'),
-                callback=self._delivery_callback
-            )
-            
-            # Flush to ensure the message is sent
-            self.producer.flush(timeout=10)
-            
-            log.debug(f"Sent event to Kafka topic {target_topic}")
+                raise ValueError("No topic specified for sending events")
+
+            deliveries = []
+
+            for event, key in zip(events, keys if keys is not None else [None] * len(events)):
+                delivery = Future()
+                self._produce(
+                    topic=target_topic,
+                    key=str(key) if key is not None else None,
+                    value=orjson.dumps(event),
+                    on_delivery=partial(self._on_delivery, delivery)
+                )
+                deliveries.append(delivery)
+
+            _, pending = wait(deliveries, timeout=timeout)
+
+            if pending:
+                raise RuntimeError(f"{len(pending)} messages were not delivered before timeout")
+
+            errors = [delivery.result() for delivery in deliveries if delivery.result() is not None]
+
+            if errors:
+                raise RuntimeError(f"{len(errors)} messages failed delivery: {str(errors[0])}")
+
+            log.debug(f"Sent {len(events)} events to Kafka topic {target_topic}")
             return True
-            
+
         except Exception as e:
-            log.error(f"Failed to send event to Kafka: {str(e)}")
+            log.error(f"Failed to send event batch to Kafka: {str(e)}")
             return False
+
+    def _produce(self, **kwargs):
+        """
+        Queue a message on the producer, waiting for room if the local queue is full.
+        
+        Messages are never flushed one by one, so a burst of sends can fill the
+        local queue before librdkafka has delivered earlier batches.
+        
+        Args:
+            **kwargs: Arguments for Producer.produce
+        """
+        while True:
+            try:
+                self.producer.produce(**kwargs)
+                return
+            except BufferError:
+                log.debug("Kafka producer queue is full, waiting for deliveries")
+                self.producer.poll(0.1)
+
+    def _poll_loop(self):
+        """Serve delivery callbacks until the producer is closed."""
+        while not self._closed.is_set():
+            self.producer.poll(0.1)
+
+    def _on_delivery(self, delivery: Future, err, msg):
+        """
+        Record the delivery report of a message on its future.
+        
+        Args:
+            delivery: Future to complete with the delivery error (or None)
+            err: Error (if any)
+            msg: Message that was delivered
+        """
+        self._delivery_callback(err, msg)
+        delivery.set_result(err)
     
     def _delivery_callback(self, err, msg):
         """
@@ -83,31 +173,53 @@ class KafkaProducer:
         if err:
             log.error(f"Message delivery failed: {str(err)}")
         else:
-            log.debug(f"Message delivered to {msg.topic()} [{msg.partition()}] at offset {msg.offset()}")
+            log.debug("Message delivered to {} [{}] at offset {}", msg.topic(), msg.partition(), msg.offset())
     
     def close(self):
         """Close the Kafka producer."""
         if hasattr(self, 'producer'):
             self.producer.flush()
+            self._closed.set()
+            self._poll_thread.join()
             log.info("Kafka producer closed")
 
 
 # Create a global producer instance
 producer = None
+# Guards creating and closing the global producer from concurrent threads
+_producer_lock = threading.Lock()
 
 def get_producer() -> KafkaProducer:
     """
     Get the global Kafka producer instance.
     
+    The producer is created on first use. Concurrent first calls share a
+    single instance instead of each opening their own connections.
+    
     Returns:
         KafkaProducer: The global Kafka producer instance
     """
     global producer
     
-    if producer is None and settings.use_kafka and settings.kafka_bootstrap_servers:
-        try:
-            producer = KafkaProducer()
-        except Exception as e:
-            log.error(f"Failed to initialize Kafka producer: {str(e)}")
+    # Skip the lock once the producer exists
+    if producer is not None:
+        return producer
+    
+    with _producer_lock:
+        if producer is None and settings.use_kafka and settings.kafka_bootstrap_servers:
+            try:
+                producer = KafkaProducer()
+            except Exception as e:
+                log.error(f"Failed to initialize Kafka producer: {str(e)}")
+    
+    return producer
+
+
+def close_producer():
+    """Flush and close the global Kafka producer instance, if one was created."""
+    global producer
     
-    return producer 
\ No newline at end of file
+    with _producer_lock:
+        if producer is not None:
+            producer.close()
+            producer = None
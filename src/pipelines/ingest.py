@@ -6,14 +6,21 @@ mapping them to OCSF, and storing them in the Neo4j graph database.
 """
 import os
 import json
+import queue
 import argparse
+import threading
 import apache_beam as beam
 from apache_beam.options.pipeline_options import PipelineOptions
 from apache_beam.io.kafka import ReadFromKafka
 from confluent_kafka import Consumer, KafkaError
 from typing import Dict, Any, List, Optional
-from src.utils import settings, log, db
+from src.utils import settings, log, db, json_loads
 from src.schemas import ocsf_schema
+from src.core import store_events, create_indexes
+
+
+# Maximum number of mapped batches waiting for the standalone graph writer
+STANDALONE_QUEUE_SIZE = 4
 
 
 class ParseEvent(beam.DoFn):
@@ -30,16 +37,14 @@ class ParseEvent(beam.DoFn):
             dict: Parsed event
         """
         try:
-            # Parse the raw event data
-            if isinstance(element, bytes):
-                element = element.decode('utf-8')
-            
-            if isinstance(element, str):
-                event = json.loads(element)
+            # Parse the raw event data; orjson reads bytes without decoding them first
+            if isinstance(element, (bytes, str)):
+                event = json_loads(element)
             else:
                 event = element
             
-            log.debug(f"Parsed event: {event}")
+            # Pass the event as an argument so it is only formatted when DEBUG is enabled
+            log.debug("Parsed event: {}", event)
             yield event
         except Exception as e:
             log.error(f"Failed to parse event: {str(e)}")
@@ -48,6 +53,12 @@ class ParseEvent(beam.DoFn):
 class DetectSourceFormat(beam.DoFn):
     """Detect the source format of an event."""
     
+    # Fields that identify each source format; OCSF events need all of theirs
+    OCSF_FIELDS = frozenset(['class_uid', 'category_uid'])
+    CEF_FIELDS = frozenset(['deviceVendor', 'deviceProduct', 'deviceVersion'])
+    LEEF_FIELDS = frozenset(['devname', 'devtime', 'devtype'])
+    SYSLOG_FIELDS = frozenset(['facility', 'severity', 'timestamp', 'hostname'])
+    
     def process(self, element):
         """
         Detect the source format of an event.
@@ -59,27 +70,76 @@ class DetectSourceFormat(beam.DoFn):
             tuple: (event, source_format)
         """
         try:
-            # Detect the source format based on event structure
-            source_format = "unknown"
+            source_format = self.detect(element)
+            
+            log.debug("Detected source format: {}", source_format)
+            yield (element, source_format)
+        except Exception as e:
+            log.error(f"Failed to detect source format: {str(e)}")
+    
+    def detect(self, element):
+        """
+        Detect the source format of an event based on its structure.
+        
+        Args:
+            element: Parsed event
+            
+        Returns:
+            str: Source format
+        """
+        source_format = "unknown"
+        
+        if isinstance(element, dict):
+            keys = element.keys()
             
             # Check if already in OCSF format (check first to avoid misclassification)
-            if isinstance(element, dict) and 'class_uid' in element and 'category_uid' in element:
+            if keys >= self.OCSF_FIELDS:
                 source_format = "ocsf"
             
             # Check for CEF format
-            elif isinstance(element, dict) and any(k in element for k in ['deviceVendor', 'deviceProduct', 'deviceVersion']):
+            elif not self.CEF_FIELDS.isdisjoint(keys):
                 source_format = "cef"
             
             # Check for LEEF format
-            elif isinstance(element, dict) and any(k in element for k in ['devname', 'devtime', 'devtype']):
+            elif not self.LEEF_FIELDS.isdisjoint(keys):
                 source_format = "leef"
             
             # Check for syslog format
-            elif isinstance(element, dict) and any(k in element for k in ['facility', 'severity', 'timestamp', 'hostname']):
+            elif not self.SYSLOG_FIELDS.isdisjoint(keys):
                 source_format = "syslog"
+        
+        return source_format
+
+
+class RouteBySourceFormat(DetectSourceFormat):
+    """
+    Detect the source format of an event and route OCSF events past mapping.
+    
+    Events already in OCSF format are emitted on the "ocsf" output as is; all other
+    events are emitted on the main output as (event, source_format) tuples.
+    """
+    
+    OCSF_OUTPUT = "ocsf"
+    
+    def process(self, element):
+        """
+        Detect the source format of an event and route it.
+        
+        Args:
+            element: Parsed event
             
-            log.debug(f"Detected source format: {source_format}")
-            yield (element, source_format)
+        Yields:
+            The OCSF event on the "ocsf" output, or a tuple of (event, source_format)
+        """
+        try:
+            source_format = self.detect(element)
+            
+            log.debug("Detected source format: {}", source_format)
+            
+            if source_format == "ocsf":
+                yield beam.pvalue.TaggedOutput(self.OCSF_OUTPUT, element)
+            else:
+                yield (element, source_format)
         except Exception as e:
             log.error(f"Failed to detect source format: {str(e)}")
 
@@ -97,26 +157,76 @@ class MapToOCSF(beam.DoFn):
         Yields:
             dict: OCSF-formatted event
         """
-        try:
-            event, source_format = element
-            
-            # If already in OCSF format, pass through
-            if source_format == "ocsf":
-                yield event
-                return
+        yield from self.map_batch([element])
+    
+    def map_batch(self, elements):
+        """
+        Map a batch of events to OCSF schema.
+        
+        Events that fail to map are logged and left out of the result.
+        
+        Args:
+            elements: Tuples of (event, source_format)
             
-            # Map to OCSF using the schema mapper
-            ocsf_event = ocsf_schema.map_to_ocsf(event, source_format)
+        Returns:
+            list: OCSF-formatted events
+        """
+        mapper = ocsf_schema.map_to_ocsf
+        ocsf_events = []
+        append = ocsf_events.append
+        
+        for element in elements:
+            try:
+                event, source_format = element
+                
+                # If already in OCSF format, pass through
+                if source_format == "ocsf":
+                    append(event)
+                else:
+                    # Map to OCSF using the schema mapper
+                    append(mapper(event, source_format))
+            except Exception as e:
+                log.error(f"Failed to map event to OCSF: {str(e)}")
+        
+        log.debug(f"Mapped {len(ocsf_events)} events to OCSF")
+        return ocsf_events
+
+
+class MapBatchToOCSF(MapToOCSF):
+    """Map batches of events, as produced by beam.BatchElements, to OCSF schema."""
+    
+    def process(self, batch):
+        """
+        Map a batch of events to OCSF schema.
+        
+        Args:
+            batch: List of (event, source_format) tuples
             
-            log.debug(f"Mapped event to OCSF: {ocsf_event}")
-            yield ocsf_event
-        except Exception as e:
-            log.error(f"Failed to map event to OCSF: {str(e)}")
+        Yields:
+            list: OCSF-formatted events of the batch
+        """
+        ocsf_events = self.map_batch(batch)
+        
+        if ocsf_events:
+            yield ocsf_events
 
 
 class StoreInGraph(beam.DoFn):
     """Store events in the Neo4j graph database."""
     
+    # Session held by the worker between setup() and teardown()
+    _session = None
+    
+    def setup(self):
+        """Open a database session for the lifetime of this DoFn instance."""
+        self._session = db.session()
+    
+    def teardown(self):
+        """Close the database session."""
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+    
     def process(self, element):
         """
         Store an event in the graph database.
@@ -127,123 +237,60 @@ class StoreInGraph(beam.DoFn):
         Yields:
             dict: Stored event with database ID
         """
-        try:
-            # Extract event class and category
-            class_uid = element.get('class_uid')
-            category_uid = element.get('category_uid')
-            
-            # Create a node for the event
-            query = """
-            CREATE (e:Event {
-                class_uid: $class_uid,
-                category_uid: $category_uid,
-                time: $time,
-                severity: $severity,
-                message: $message,
-                metadata: $metadata
-            })
-            RETURN id(e) as id
-            """
-            
-            params = {
-                "class_uid": class_uid,
-                "category_uid": category_uid,
-                "time": element.get('time'),
-                "severity": element.get('severity', 0),
-                "message": element.get('message', ''),
-                "metadata": json.dumps(element.get('metadata', {}))
-            }
-            
-            result = db.execute_query(query, params)
-            
-            if result and len(result) > 0:
-                event_id = result[0]['id']
-                element['_id'] = event_id
-                log.info(f"Stored event in graph database with ID: {event_id}")
-                
-                # Process additional entities based on event class
-                self._process_entities(element, event_id)
-                
-                yield element
-            else:
-                log.error("Failed to store event in graph database")
-        except Exception as e:
-            log.error(f"Failed to store event in graph database: {str(e)}")
+        yield from self.store_batch([element])
     
-    def _process_entities(self, event, event_id):
+    def store_batch(self, elements):
         """
-        Process additional entities from the event.
+        Store a batch of events, with their source, destination and principal
+        entities, in the graph database with a single query.
+        
+        If the batch fails to store, its events are retried one by one, so a
+        single bad event is logged and left out instead of dropping the batch.
         
         Args:
-            event: OCSF-formatted event
-            event_id: Database ID of the event node
+            elements: OCSF-formatted events
+            
+        Returns:
+            list: Stored events with their integer node IDs in '_id'
         """
         try:
-            # Extract and create nodes for entities based on event class
-            # This is a simplified example - in a real implementation, this would be more complex
-            
-            # Process source entity if present
-            if 'src' in event:
-                src = event['src']
-                src_type = src.get('type', 'Unknown')
-                src_query = f"""
-                MERGE (s:{src_type} {{id: $src_id}})
-                ON CREATE SET s += $src_props
-                WITH s
-                MATCH (e:Event) WHERE id(e) = $event_id
-                CREATE (s)-[:GENERATED]->(e)
-                """
-                
-                src_params = {
-                    "src_id": src.get('id', str(hash(json.dumps(src)))),
-                    "src_props": {k: v for k, v in src.items() if k not in ['id', 'type']},
-                    "event_id": event_id
-                }
-                
-                db.execute_query(src_query, src_params)
+            event_ids = store_events(elements, session=self._session)
+        except Exception as e:
+            log.error(f"Failed to store {len(elements)} events in graph database: {str(e)}")
             
-            # Process destination entity if present
-            if 'dst' in event:
-                dst = event['dst']
-                dst_type = dst.get('type', 'Unknown')
-                dst_query = f"""
-                MERGE (d:{dst_type} {{id: $dst_id}})
-                ON CREATE SET d += $dst_props
-                WITH d
-                MATCH (e:Event) WHERE id(e) = $event_id
-                CREATE (e)-[:TARGETS]->(d)
-                """
-                
-                dst_params = {
-                    "dst_id": dst.get('id', str(hash(json.dumps(dst)))),
-                    "dst_props": {k: v for k, v in dst.items() if k not in ['id', 'type']},
-                    "event_id": event_id
-                }
-                
-                db.execute_query(dst_query, dst_params)
+            if len(elements) <= 1:
+                return []
             
-            # Process principal (user) entity if present
-            if 'principal' in event:
-                principal = event['principal']
-                principal_type = principal.get('type', 'User')
-                principal_query = f"""
-                MERGE (p:{principal_type} {{id: $principal_id}})
-                ON CREATE SET p += $principal_props
-                WITH p
-                MATCH (e:Event) WHERE id(e) = $event_id
-                CREATE (p)-[:PERFORMED]->(e)
-                """
-                
-                principal_params = {
-                    "principal_id": principal.get('id', str(hash(json.dumps(principal)))),
-                    "principal_props": {k: v for k, v in principal.items() if k not in ['id', 'type']},
-                    "event_id": event_id
-                }
-                
-                db.execute_query(principal_query, principal_params)
+            stored = []
+            for element in elements:
+                stored.extend(self.store_batch([element]))
+            return stored
         
-        except Exception as e:
-            log.error(f"Failed to process entities for event {event_id}: {str(e)}")
+        # store_events returns IDs as strings for the API; keep the node ID type
+        for element, event_id in zip(elements, event_ids):
+            element['_id'] = int(event_id)
+        
+        log.info(f"Stored {len(elements)} events in graph database")
+        return elements
+
+
+class StoreBatchInGraph(StoreInGraph):
+    """Store batches of OCSF events in the Neo4j graph database."""
+    
+    def process(self, batch):
+        """
+        Store a batch of events in the graph database.
+        
+        Events that fail to store are logged and left out; the rest of the
+        batch is still stored.
+        
+        Args:
+            batch: List of OCSF-formatted events
+            
+        Yields:
+            dict: Stored event with database ID
+        """
+        yield from self.store_batch(batch)
 
 
 def run_pipeline(config_file=None):
@@ -259,11 +306,12 @@ def run_pipeline(config_file=None):
         with open(config_file, 'r') as f:
             config = json.load(f)
     
-    # Set up pipeline options
+    # Set up pipeline options. The pipeline is I/O bound, so worker threads sharing
+    # the Neo4j connection pool beat worker processes that pickle every event
     pipeline_options = PipelineOptions([
         '--runner=DirectRunner',
-        '--direct_running_mode=multi_processing',
-        '--direct_num_workers=4'
+        '--direct_running_mode=multi_threading',
+        '--direct_num_workers=8'
     ])
     
     # Get Kafka configuration
@@ -274,10 +322,13 @@ def run_pipeline(config_file=None):
         log.error("Kafka configuration is missing")
         return
     
+    # Entities are merged by id, so make sure those lookups are indexed
+    create_indexes()
+    
     # Create and run the pipeline
     with beam.Pipeline(options=pipeline_options) as pipeline:
         # Read from Kafka
-        events = (
+        routed_events = (
             pipeline
             | "Read from Kafka" >> ReadFromKafka(
                 consumer_config={
@@ -288,9 +339,28 @@ def run_pipeline(config_file=None):
                 topics=[kafka_topic]
             )
             | "Parse Events" >> beam.ParDo(ParseEvent())
-            | "Detect Source Format" >> beam.ParDo(DetectSourceFormat())
-            | "Map to OCSF" >> beam.ParDo(MapToOCSF())
-            | "Store in Graph" >> beam.ParDo(StoreInGraph())
+            | "Detect Source Format" >> beam.ParDo(RouteBySourceFormat()).with_outputs(
+                RouteBySourceFormat.OCSF_OUTPUT, main="raw"
+            )
+        )
+        
+        # Map and store events in batches to avoid per-event DoFn and query overhead.
+        # Events already in OCSF format skip the mapping stage.
+        ocsf_batches = (
+            routed_events[RouteBySourceFormat.OCSF_OUTPUT]
+            | "Batch OCSF Events" >> beam.BatchElements(min_batch_size=200, max_batch_size=2000)
+        )
+        
+        mapped_batches = (
+            routed_events.raw
+            | "Batch Events" >> beam.BatchElements(min_batch_size=200, max_batch_size=2000)
+            | "Map to OCSF" >> beam.ParDo(MapBatchToOCSF())
+        )
+        
+        (
+            (ocsf_batches, mapped_batches)
+            | "Merge Batches" >> beam.Flatten()
+            | "Store in Graph" >> beam.ParDo(StoreBatchInGraph())
         )
     
     log.info("Pipeline completed")
@@ -306,11 +376,20 @@ def run_standalone():
         log.error("Kafka configuration is missing")
         return
     
+    # Entities are merged by id, so make sure those lookups are indexed
+    create_indexes()
+    
     # Create Kafka consumer
     consumer = Consumer({
         'bootstrap.servers': kafka_bootstrap_servers,
         'group.id': settings.kafka_consumer_group,
-        'auto.offset.reset': 'latest'
+        'auto.offset.reset': 'latest',
+        'enable.auto.commit': True,
+        'auto.commit.interval.ms': 5000,
+        # Fetch in large batches rather than many small requests
+        'fetch.wait.max.ms': settings.kafka_fetch_wait_max_ms,
+        'fetch.min.bytes': settings.kafka_fetch_min_bytes,
+        'queued.max.messages.kbytes': settings.kafka_queued_max_messages_kbytes
     })
     
     # Subscribe to topic
@@ -322,31 +401,93 @@ def run_standalone():
     map_to_ocsf = MapToOCSF()
     store_in_graph = StoreInGraph()
     
+    # Hand mapped batches to a writer thread, so graph writes overlap Kafka fetches.
+    # The queue is bounded to hold back consumption when the database falls behind.
+    batches = queue.Queue(maxsize=STANDALONE_QUEUE_SIZE)
+    # Error that stopped the writer thread, re-raised by the consuming thread
+    writer_errors = []
+    
+    def write_batches():
+        running = True
+        
+        try:
+            # Keep one database session for all writes of this thread
+            store_in_graph.setup()
+            
+            while running:
+                ocsf_events = batches.get()
+                
+                if ocsf_events is None:
+                    break
+                
+                # Merge batches queued while the previous write was running
+                while True:
+                    try:
+                        queued_events = batches.get_nowait()
+                    except queue.Empty:
+                        break
+                    
+                    if queued_events is None:
+                        running = False
+                        break
+                    
+                    ocsf_events.extend(queued_events)
+                
+                for stored_event in store_in_graph.store_batch(ocsf_events):
+                    log.info("Successfully processed event: {}", stored_event.get('_id'))
+        except Exception as e:
+            log.error(f"Graph writer stopped: {str(e)}")
+            writer_errors.append(e)
+        finally:
+            store_in_graph.teardown()
+    
+    def queue_batch(item):
+        """Queue an item for the writer, returning False if the writer has stopped."""
+        while writer.is_alive():
+            try:
+                batches.put(item, timeout=1.0)
+                return True
+            except queue.Full:
+                continue
+        return False
+    
+    writer = threading.Thread(target=write_batches, name="graph-writer")
+    writer.start()
+    
     try:
         log.info(f"Starting standalone pipeline, consuming from {kafka_topic}")
         
         while True:
-            msg = consumer.poll(1.0)
+            # Fetch up to a batch of messages per call
+            msgs = consumer.consume(num_messages=settings.kafka_consume_batch_size, timeout=1.0)
             
-            if msg is None:
-                continue
+            events_with_format = []
             
-            if msg.error():
-                if msg.error().code() == KafkaError._PARTITION_EOF:
-                    log.debug(f"Reached end of partition {msg.partition()}")
-                else:
-                    log.error(f"Kafka error: {msg.error()}")
-            else:
+            for msg in msgs:
+                if msg.error():
+                    if msg.error().code() == KafkaError._PARTITION_EOF:
+                        log.debug(f"Reached end of partition {msg.partition()}")
+                    else:
+                        log.error(f"Kafka error: {msg.error()}")
+                    continue
+                
                 # Process the message
                 for parsed_event in parse_event.process(msg.value()):
-                    for event_with_format in detect_source_format.process(parsed_event):
-                        for ocsf_event in map_to_ocsf.process(event_with_format):
-                            for stored_event in store_in_graph.process(ocsf_event):
-                                log.info(f"Successfully processed event: {stored_event.get('_id')}")
+                    events_with_format.extend(detect_source_format.process(parsed_event))
+            
+            # Map the events of the whole batch at once and queue them for storage
+            ocsf_events = map_to_ocsf.map_batch(events_with_format)
+            
+            # A full queue would block forever once the writer is gone
+            if ocsf_events and not queue_batch(ocsf_events):
+                raise RuntimeError("Graph writer thread stopped") from (writer_errors[0] if writer_errors else None)
     
     except KeyboardInterrupt:
         log.info("Stopping pipeline")
     finally:
+        # Store the batches still queued before closing the consumer
+        queue_batch(None)
+        writer.join()
         consumer.close()
 
 
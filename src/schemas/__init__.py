@@ -3,7 +3,8 @@ Schema modules for the application.
 """
 from .ocsf_schema import OCSFSchema
 
-# Create a singleton instance of the OCSFSchema class
-ocsf_schema = OCSFSchema()
+# Create a singleton instance of the OCSFSchema class. Mapping events does not
+# need the schema files, so they are loaded on first validation, not on import.
+ocsf_schema = OCSFSchema(auto_load=False)
 
 __all__ = ["ocsf_schema", "OCSFSchema"] 
\ No newline at end of file
@@ -4,11 +4,68 @@ OCSF Schema handling module.
 This module provides utilities for working with the Open Cybersecurity Schema Framework (OCSF).
 """
 import os
-import json
+import hashlib
+import tempfile
+import threading
 import yaml
+import orjson
 from typing import Dict, Any, List, Optional
-from jsonschema import validate, ValidationError
-from src.utils import settings, log
+import fastjsonschema
+from jsonschema import SchemaError
+from jsonschema.validators import validator_for
+from src.utils import settings, log, json_loads
+
+# Parse YAML schemas with libyaml when PyYAML was built with it
+try:
+    from yaml import CSafeLoader as YamlLoader
+except ImportError:
+    from yaml import SafeLoader as YamlLoader
+    log.warning("libyaml is not available, loading OCSF YAML schemas with the pure Python parser")
+
+
+# Prefix of the cache files holding the parsed schemas of the last load, one
+# per schema directory. They are written to a cache directory, not next to the
+# schemas, since schema directories are often read-only.
+SCHEMA_CACHE_PREFIX = "ocsf-schemas-"
+
+# Syslog severity is 0-7, OCSF might use a different scale
+# This is a placeholder mapping
+SYSLOG_TO_OCSF_SEVERITY = {
+    0: 10,  # Emergency -> Critical
+    1: 9,   # Alert -> High
+    2: 8,   # Critical -> High
+    3: 7,   # Error -> Medium
+    4: 6,   # Warning -> Medium
+    5: 5,   # Notice -> Low
+    6: 4,   # Informational -> Low
+    7: 3,   # Debug -> Informational
+}
+
+# Extensions of schema files, lowercased and without the dot
+SCHEMA_FILE_EXTENSIONS = frozenset(["json", "yaml", "yml"])
+
+
+def _iter_schema_files(path: str):
+    """
+    Find the schema files under a directory.
+    
+    Args:
+        path (str): Directory to search recursively
+        
+    Yields:
+        tuple: The os.DirEntry of each schema file and its lowercased extension
+    """
+    stack = [path]
+    
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file():
+                    ext = entry.name.rpartition('.')[2].lower()
+                    if ext in SCHEMA_FILE_EXTENSIONS:
+                        yield entry, ext
 
 
 class OCSFSchema:
@@ -18,7 +75,7 @@ class OCSFSchema:
     This class provides methods for loading, validating, and working with OCSF schemas.
     """
     
-    def __init__(self, schema_path=None, schema_version=None, auto_load=True):
+    def __init__(self, schema_path=None, schema_version=None, auto_load=True, cache_dir=None):
         """
         Initialize the OCSF Schema manager.
         
@@ -26,44 +83,188 @@ class OCSFSchema:
             schema_path (str, optional): Path to schema directory. Defaults to settings.ocsf_schema_path.
             schema_version (str, optional): Schema version. Defaults to settings.ocsf_schema_version.
             auto_load (bool, optional): Whether to load schemas automatically. Defaults to True.
+            cache_dir (str, optional): Directory for the parsed schema cache. Defaults to
+                settings.ocsf_schema_cache_dir, or a directory under the system temp dir.
         """
         self.schema_path = schema_path or settings.ocsf_schema_path
+        self.cache_dir = (
+            cache_dir
+            or settings.ocsf_schema_cache_dir
+            or os.path.join(tempfile.gettempdir(), "blueprintgraph")
+        )
         self.schema_version = schema_version or settings.ocsf_schema_version
         self.schemas = {}
+        # Set once schemas are fully loaded; loads are serialized by the load lock
+        self._loaded = False
+        self._load_lock = threading.Lock()
+        # Validation functions compiled once per schema, so validating an event never rebuilds one
+        self._validators = {}
+        # Compiled validation functions by schema content, shared by identical schemas
+        self._validators_by_hash = {}
+        self._mappers = {
+            'syslog': self._map_syslog_to_ocsf,
+            'cef': self._map_cef_to_ocsf,
+            'leef': self._map_leef_to_ocsf
+        }
         if auto_load:
             self.load_schemas()
     
     def load_schemas(self):
-        """Load all OCSF schemas from the schema directory."""
+        """
+        Load all OCSF schemas from the schema directory.
+        
+        The parsed schemas are cached in a single file in the cache directory.
+        While no schema file has been added, removed or modified since, later
+        loads read that one file instead of parsing every schema again.
+        """
+        with self._load_lock:
+            self._load_schemas()
+    
+    def _load_schemas(self):
+        """Load all OCSF schemas; the caller holds the load lock."""
         try:
             if not os.path.exists(self.schema_path):
                 log.warning(f"OCSF schema path does not exist: {self.schema_path}")
                 return
             
-            # Load all schema files
-            for root, _, files in os.walk(self.schema_path):
-                for file in files:
-                    if file.endswith(('.json', '.yaml', '.yml')):
-                        file_path = os.path.join(root, file)
-                        schema_name = os.path.splitext(file)[0]
+            # Find all schema files and fingerprint them by modification time and size
+            schema_files = list(_iter_schema_files(self.schema_path))
+            
+            fingerprint = {}
+            for entry, _ in schema_files:
+                stat = entry.stat()
+                fingerprint[os.path.relpath(entry.path, self.schema_path)] = [stat.st_mtime_ns, stat.st_size]
+            
+            schemas = self._read_schema_cache(fingerprint)
+            
+            if schemas is None:
+                schemas = {}
+                complete = True
+                
+                # Load all schema files
+                for entry, ext in schema_files:
+                    file_path = entry.path
+                    schema_name = os.path.splitext(entry.name)[0]
+                    
+                    try:
+                        if ext == 'json':
+                            with open(file_path, 'rb') as f:
+                                schema = json_loads(f.read())
+                        else:
+                            with open(file_path, 'r') as f:
+                                schema = yaml.load(f, Loader=YamlLoader)
                         
-                        try:
-                            if file.endswith('.json'):
-                                with open(file_path, 'r') as f:
-                                    schema = json.load(f)
-                            else:
-                                with open(file_path, 'r') as f:
-                                    schema = yaml.safe_load(f)
-                            
-                            self.schemas[schema_name] = schema
-                            log.debug(f"Loaded OCSF schema: {schema_name}")
-                        except Exception as e:
-                            log.error(f"Failed to load schema {file_path}: {str(e)}")
+                        schemas[schema_name] = schema
+                        log.debug("Loaded OCSF schema: {}", schema_name)
+                    except Exception as e:
+                        complete = False
+                        log.error(f"Failed to load schema {file_path}: {str(e)}")
+                
+                # Only cache a complete load, so failing files are retried and reported
+                if complete:
+                    self._write_schema_cache(fingerprint, schemas)
+            
+            for schema_name, schema in schemas.items():
+                self.schemas[schema_name] = schema
+                self._validators[schema_name] = self._compile_validator(schema)
             
             log.info(f"Loaded {len(self.schemas)} OCSF schemas")
+            self._loaded = True
         except Exception as e:
             log.error(f"Failed to load OCSF schemas: {str(e)}")
     
+    def _schema_cache_path(self) -> str:
+        """
+        Get the cache file of the schema directory.
+        
+        Returns:
+            str: Path of the cache file, named after the absolute schema path
+        """
+        digest = hashlib.blake2b(os.path.abspath(self.schema_path).encode(), digest_size=8).hexdigest()
+        return os.path.join(self.cache_dir, f"{SCHEMA_CACHE_PREFIX}{digest}.cache")
+    
+    def _read_schema_cache(self, fingerprint: Dict[str, List[int]]) -> Optional[Dict[str, Any]]:
+        """
+        Read the cached schemas if they were parsed from the current schema files.
+        
+        Args:
+            fingerprint (dict): Modification time and size of each schema file
+            
+        Returns:
+            dict: Cached schemas by name, or None if the cache is missing or stale
+        """
+        cache_path = self._schema_cache_path()
+        
+        try:
+            with open(cache_path, 'rb') as f:
+                cache = json_loads(f.read())
+        except (OSError, orjson.JSONDecodeError):
+            return None
+        
+        if cache.get("fingerprint") != fingerprint:
+            return None
+        
+        log.debug("Loaded OCSF schemas from cache: {}", cache_path)
+        return cache.get("schemas", {})
+    
+    def _write_schema_cache(self, fingerprint: Dict[str, List[int]], schemas: Dict[str, Any]):
+        """
+        Write the parsed schemas to the cache file.
+        
+        The file is replaced atomically, so concurrent loads never read a partial
+        cache. Failing to write it, e.g. on a read-only file system, only costs
+        parsing the schemas again next time.
+        
+        Args:
+            fingerprint (dict): Modification time and size of each schema file
+            schemas (dict): Parsed schemas by name
+        """
+        cache_path = self._schema_cache_path()
+        
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, prefix=SCHEMA_CACHE_PREFIX)
+            
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(orjson.dumps({"fingerprint": fingerprint, "schemas": schemas}, default=str))
+                os.replace(temp_path, cache_path)
+            except BaseException:
+                os.unlink(temp_path)
+                raise
+        except Exception as e:
+            log.debug("Could not write OCSF schema cache {}: {}", cache_path, e)
+    
+    def _compile_validator(self, schema: Dict[str, Any]):
+        """
+        Compile a schema into a validation function, checking the schema itself once.
+        
+        fastjsonschema generates Python code specialized to the schema. Defaults
+        are not filled into events and formats are not checked, matching
+        jsonschema.validate. Schemas with the same canonical JSON share one
+        compiled function.
+        
+        Args:
+            schema (dict): The JSON schema
+            
+        Returns:
+            The validation function, or None if the schema is invalid
+        """
+        key = hashlib.blake2b(orjson.dumps(schema, option=orjson.OPT_SORT_KEYS, default=str), digest_size=16).digest()
+        
+        if key in self._validators_by_hash:
+            return self._validators_by_hash[key]
+        
+        try:
+            validator_for(schema).check_schema(schema)
+            validator = fastjsonschema.compile(schema, use_default=False, use_formats=False)
+        except (SchemaError, fastjsonschema.JsonSchemaDefinitionException) as e:
+            log.error(f"Invalid OCSF schema: {str(e)}")
+            validator = None
+        
+        self._validators_by_hash[key] = validator
+        return validator
+    
     def validate_event(self, event: Dict[str, Any], schema_type: str) -> bool:
         """
         Validate an event against an OCSF schema.
@@ -75,15 +276,32 @@ class OCSFSchema:
         Returns:
             bool: True if valid, False otherwise
         """
+        # Load schemas on first use when they were not loaded up front. Other
+        # threads wait for the load instead of reading a partly loaded dict
+        if not self._loaded:
+            with self._load_lock:
+                if not self._loaded:
+                    self._load_schemas()
+        
         if schema_type not in self.schemas:
-            log.error(f"Schema type not found: {schema_type}")
+            log.error("Schema type not found: {}", schema_type)
+            return False
+        
+        # Compile schemas added to self.schemas outside load_schemas on first use
+        if schema_type not in self._validators:
+            self._validators[schema_type] = self._compile_validator(self.schemas[schema_type])
+        
+        validator = self._validators[schema_type]
+        
+        if validator is None:
+            log.error("Schema type is invalid: {}", schema_type)
             return False
         
         try:
-            validate(instance=event, schema=self.schemas[schema_type])
+            validator(event)
             return True
-        except ValidationError as e:
-            log.error(f"Event validation failed: {str(e)}")
+        except fastjsonschema.JsonSchemaValueException as e:
+            log.error("Event validation failed: {}", e.message)
             return False
     
     def map_to_ocsf(self, event: Dict[str, Any], source_format: str) -> Dict[str, Any]:
@@ -100,15 +318,13 @@ class OCSFSchema:
         # This is a placeholder for actual mapping logic
         # In a real implementation, this would use mapping rules specific to the source format
         
-        if source_format == 'syslog':
-            return self._map_syslog_to_ocsf(event)
-        elif source_format == 'cef':
-            return self._map_cef_to_ocsf(event)
-        elif source_format == 'leef':
-            return self._map_leef_to_ocsf(event)
-        else:
-            log.warning(f"Unsupported source format: {source_format}")
+        mapper = self._mappers.get(source_format)
+        
+        if mapper is None:
+            log.warning("Unsupported source format: {}", source_format)
             return event
+        
+        return mapper(event)
     
     def _map_syslog_to_ocsf(self, event: Dict[str, Any]) -> Dict[str, Any]:
         """Map a syslog event to OCSF."""
@@ -117,7 +333,8 @@ class OCSFSchema:
             "class_uid": "0001",  # Example class UID
             "category_uid": "0002",  # Example category UID
             "time": event.get("timestamp"),
-            "severity": self._map_syslog_severity(event.get("severity", 0)),
+            # Look the severity up inline rather than through _map_syslog_severity
+            "severity": SYSLOG_TO_OCSF_SEVERITY.get(event.get("severity", 0), 5),
             "message": event.get("message", ""),
             "metadata": {
                 "version": self.schema_version,
@@ -169,20 +386,4 @@ class OCSFSchema:
     
     def _map_syslog_severity(self, severity: int) -> int:
         """Map syslog severity to OCSF severity."""
-        # Syslog severity is 0-7, OCSF might use a different scale
-        # This is a placeholder mapping
-        syslog_to_ocsf = {
-            0: 10,  # Emergency -> Critical
-            1: 9,   # Alert -> High
-            2: 8,   # Critical -> High
-            3: 7,   # Error -> Medium
-            4: 6,   # Warning -> Medium
-            5: 5,   # Notice -> Low
-            6: 4,   # Informational -> Low
-            7: 3,   # Debug -> Informational
-        }
-        return syslog_to_ocsf.get(severity, 5)  # Default to Low if unknown
-
-
-# Create a global OCSF schema instance
-ocsf_schema = OCSFSchema() 
\ No newline at end of file
+        return SYSLOG_TO_OCSF_SEVERITY.get(severity, 5)  # Default to Low if unknown
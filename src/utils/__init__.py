@@ -4,5 +4,8 @@ Utility modules for the application.
 from .config import settings
 from .logging import log
 from .db import db
+from .query_cache import query_cache
+from .serialization import json_dumps, json_loads, entity_id
+from .profiling import phase
 
-__all__ = ["settings", "log", "db"] 
\ No newline at end of file
+__all__ = ["settings", "log", "db", "query_cache", "json_dumps", "json_loads", "entity_id", "phase"] 
\ No newline at end of file
@@ -20,16 +20,35 @@ class Settings(BaseSettings):
     api_port: int = Field(8000, env="API_PORT")
     api_debug: bool = Field(False, env="API_DEBUG")
     api_log_level: str = Field("INFO", env="API_LOG_LEVEL")
+    enable_cors: bool = Field(True, env="ENABLE_CORS")
+    enable_profiling: bool = Field(False, env="ENABLE_PROFILING")
     
     # Pipeline Configuration
     kafka_bootstrap_servers: Optional[str] = Field(None, env="KAFKA_BOOTSTRAP_SERVERS")
     kafka_topic_input: Optional[str] = Field("security-events", env="KAFKA_TOPIC_INPUT")
     kafka_consumer_group: Optional[str] = Field("blueprintgraph-consumer", env="KAFKA_CONSUMER_GROUP")
     use_kafka: bool = Field(False, env="USE_KAFKA")
+    kafka_linger_ms: int = Field(20, env="KAFKA_LINGER_MS")
+    kafka_batch_size: int = Field(65536, env="KAFKA_BATCH_SIZE")
+    kafka_compression_type: str = Field("lz4", env="KAFKA_COMPRESSION_TYPE")
+    kafka_batch_num_messages: int = Field(10000, env="KAFKA_BATCH_NUM_MESSAGES")
+    kafka_consume_batch_size: int = Field(500, env="KAFKA_CONSUME_BATCH_SIZE")
+    kafka_fetch_wait_max_ms: int = Field(500, env="KAFKA_FETCH_WAIT_MAX_MS")
+    kafka_fetch_min_bytes: int = Field(1048576, env="KAFKA_FETCH_MIN_BYTES")
+    kafka_queued_max_messages_kbytes: int = Field(262144, env="KAFKA_QUEUED_MAX_MESSAGES_KBYTES")
+    
+    # Query Cache Configuration
+    query_cache_max_size: int = Field(1024, env="QUERY_CACHE_MAX_SIZE")
+    query_cache_ttl: float = Field(30.0, env="QUERY_CACHE_TTL")
+    
+    # Detection Configuration
+    detection_concurrency: int = Field(16, env="DETECTION_CONCURRENCY")
     
     # OCSF Configuration
     ocsf_schema_version: str = Field("1.0.0", env="OCSF_SCHEMA_VERSION")
     ocsf_schema_path: str = Field("src/schemas/ocsf", env="OCSF_SCHEMA_PATH")
+    # Directory for the parsed schema cache; defaults to a directory under the system temp dir
+    ocsf_schema_cache_dir: Optional[str] = Field(None, env="OCSF_SCHEMA_CACHE_DIR")
     
     # Application Configuration
     log_level: str = Field("INFO", env="LOG_LEVEL")
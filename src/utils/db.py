@@ -1,8 +1,9 @@
 """
 Database connection module for Neo4j.
 """
+import asyncio
+import threading
 from neo4j import GraphDatabase
-from py2neo import Graph
 from .config import settings
 from .logging import log
 
@@ -12,13 +13,16 @@ class Neo4jConnection:
     Neo4j database connection manager.
     
     This class provides methods for connecting to Neo4j and executing queries.
-    It supports both the official Neo4j Python driver and py2neo for different use cases.
+    All queries go through a single official Neo4j Python driver and its connection pool.
     """
     
     def __init__(self, auto_connect=True):
         """Initialize the Neo4j connection."""
         self._driver = None
-        self._graph = None
+        # Queries run in worker threads, so only one of them may open the connection
+        self._connect_lock = threading.Lock()
+        # Session reused by the queries of each thread, with the driver it belongs to
+        self._local = threading.local()
         if auto_connect:
             try:
                 self._connect()
@@ -27,6 +31,15 @@ class Neo4jConnection:
     
     def _connect(self):
         """Establish connection to Neo4j database."""
+        with self._connect_lock:
+            # Another thread may have connected while this one waited
+            if self._driver is not None:
+                return
+            
+            self._open()
+    
+    def _open(self):
+        """Open the driver connection to Neo4j."""
         try:
             # Print connection details for debugging
             log.info(f"Connecting to Neo4j with URI: {settings.neo4j_uri}, User: {settings.neo4j_user}")
@@ -44,12 +57,6 @@ class Neo4jConnection:
                 if test_value != 1:
                     raise ValueError("Connection test failed")
             
-            # Connect using py2neo for higher-level operations
-            self._graph = Graph(
-                settings.neo4j_uri,
-                auth=(settings.neo4j_user, settings.neo4j_password)
-            )
-            
             log.info("Successfully connected to Neo4j database")
         except Exception as e:
             log.error(f"Failed to connect to Neo4j: {str(e)}")
@@ -60,33 +67,226 @@ class Neo4jConnection:
         if self._driver:
             self._driver.close()
             self._driver = None
-        self._graph = None
         log.info("Neo4j connection closed")
     
-    def execute_query(self, query, parameters=None):
+    def session(self):
+        """
+        Open a session on the shared driver.
+        
+        Callers running many queries, such as pipeline workers, can hold one
+        session instead of opening a new one per query. The caller must close it.
+        
+        Returns:
+            neo4j.Session: A new session
+        """
+        if not self._driver:
+            self._connect()
+        
+        return self._driver.session()
+    
+    def _thread_session(self):
+        """
+        Get the session reused by queries of the current thread.
+        
+        Sessions are not thread-safe, so each thread keeps its own. A session
+        opened on a driver that has since been closed is replaced.
+        
+        Returns:
+            neo4j.Session: The session of the current thread
+        """
+        if not self._driver:
+            self._connect()
+        
+        cached = getattr(self._local, "session", None)
+        
+        if cached is None or cached[0] is not self._driver:
+            cached = (self._driver, self._driver.session())
+            self._local.session = cached
+        
+        return cached[1]
+    
+    def close_thread_session(self):
+        """Close the session of the current thread, if it has one."""
+        cached = getattr(self._local, "session", None)
+        self._local.session = None
+        
+        if cached is not None:
+            try:
+                cached[1].close()
+            except Exception as e:
+                log.debug("Failed to close Neo4j session: {}", e)
+    
+    def _run_in_thread_session(self, func):
+        """
+        Run a function with the session of the current thread.
+        
+        The session is discarded if the function fails, so a session left in
+        a broken state is never reused.
+        
+        Args:
+            func (callable): Function taking the session
+            
+        Returns:
+            Any: Result of the function
+        """
+        try:
+            return func(self._thread_session())
+        except Exception:
+            self.close_thread_session()
+            raise
+    
+    def execute_query(self, query, parameters=None, session=None):
         """
         Execute a Cypher query using the official driver.
         
         Args:
             query (str): The Cypher query to execute
             parameters (dict, optional): Query parameters
+            session (neo4j.Session, optional): Open session to run the query in;
+                the session of the current thread is used if not given
+            
+        Returns:
+            list: Query results
+        """
+        if session is not None:
+            return self._run(session, query, parameters)
+        
+        return self._run_in_thread_session(lambda thread_session: self._run(thread_session, query, parameters))
+    
+    def _run(self, session, query, parameters=None):
+        """
+        Run a Cypher query in a session and read all of its records.
+        
+        Args:
+            session (neo4j.Session): The session to run the query in
+            query (str): The Cypher query to execute
+            parameters (dict, optional): Query parameters
             
         Returns:
             list: Query results
         """
+        try:
+            result = session.run(query, parameters or {})
+            return [record.data() for record in result]
+        except Exception as e:
+            log.error("Query execution failed: {} | Query: {} | Parameters: {}", e, query, parameters)
+            raise
+    
+    def execute_write(self, query, parameters=None, session=None):
+        """
+        Execute a write query in a managed write transaction.
+        
+        Unlike execute_query, the driver retries the transaction on transient
+        errors such as deadlocks between concurrent batches merging the same
+        nodes.
+        
+        Args:
+            query (str): The Cypher query to execute
+            parameters (dict, optional): Query parameters
+            session (neo4j.Session, optional): Open session to run the query in;
+                the session of the current thread is used if not given
+            
+        Returns:
+            list: Query results
+        """
+        def work(tx):
+            return [record.data() for record in tx.run(query, parameters or {})]
+        
+        try:
+            if session is not None:
+                return session.execute_write(work)
+            
+            return self._run_in_thread_session(lambda thread_session: thread_session.execute_write(work))
+        except Exception as e:
+            log.error("Query execution failed: {} | Query: {} | Parameters: {}", e, query, parameters)
+            raise
+    
+    def execute_many(self, query, rows, session=None):
+        """
+        Execute a write query for many rows with a single round trip.
+        
+        The query receives the rows as $rows and should UNWIND them, so Neo4j
+        plans it once and writes every row in one transaction.
+        
+        Args:
+            query (str): The Cypher query to execute, using $rows
+            rows (list): One parameter map per row
+            session (neo4j.Session, optional): Open session to run the query in
+            
+        Returns:
+            list: Query results
+        """
+        return self.execute_write(query, {"rows": rows}, session=session)
+    
+    def execute_query_values(self, query, parameters=None):
+        """
+        Execute a Cypher query and return the raw values of each record.
+        
+        Unlike execute_query, nodes and relationships are returned as
+        neo4j.graph.Node and neo4j.graph.Relationship objects, keeping their
+        labels, types and endpoints.
+        
+        Args:
+            query (str): The Cypher query to execute
+            parameters (dict, optional): Query parameters
+            
+        Returns:
+            list: List of record values
+        """
+        def run(session):
+            result = session.run(query, parameters or {})
+            return [record.values() for record in result]
+        
+        try:
+            return self._run_in_thread_session(run)
+        except Exception as e:
+            log.error("Query execution failed: {} | Query: {} | Parameters: {}", e, query, parameters)
+            raise
+    
+    def stream_query(self, query, parameters=None):
+        """
+        Execute a Cypher query and yield records as the driver receives them.
+        
+        The session stays open until the generator is exhausted or closed, so
+        callers can start consuming results before the full result set has
+        been read from Neo4j. The generator may be advanced from different
+        threads, so it uses a session of its own rather than a thread's session.
+        
+        Args:
+            query (str): The Cypher query to execute
+            parameters (dict, optional): Query parameters
+            
+        Yields:
+            dict: Query result records
+        """
         if not self._driver:
             self._connect()
         
         try:
             with self._driver.session() as session:
                 result = session.run(query, parameters or {})
-                return [record.data() for record in result]
+                for record in result:
+                    yield record.data()
         except Exception as e:
-            log.error(f"Query execution failed: {str(e)}")
-            log.error(f"Query: {query}")
-            log.error(f"Parameters: {parameters}")
+            log.error("Query execution failed: {} | Query: {} | Parameters: {}", e, query, parameters)
             raise
     
+    async def execute_query_async(self, query, parameters=None):
+        """
+        Execute a Cypher query without blocking the event loop.
+        
+        The query runs on the shared driver in a worker thread, so concurrent
+        callers can overlap their round-trips to Neo4j.
+        
+        Args:
+            query (str): The Cypher query to execute
+            parameters (dict, optional): Query parameters
+            
+        Returns:
+            list: Query results
+        """
+        return await asyncio.to_thread(self.execute_query, query, parameters)
+    
     def execute_write_transaction(self, func, *args, **kwargs):
         """
         Execute a write transaction function.
@@ -122,19 +322,8 @@ class Neo4jConnection:
         
         with self._driver.session() as session:
             return session.execute_read(func, *args, **kwargs)
-    
-    @property
-    def graph(self):
-        """
-        Get the py2neo Graph object.
-        
-        Returns:
-            Graph: py2neo Graph object
-        """
-        if not self._graph:
-            self._connect()
-        return self._graph
 
 
-# Create a global database connection instance
-db = Neo4jConnection(auto_connect=True) 
\ No newline at end of file
+# Create a global database connection instance. It connects on first use, so
+# importing the application does not open a connection to Neo4j.
+db = Neo4jConnection(auto_connect=False) 
\ No newline at end of file
@@ -6,6 +6,15 @@ import logging
 from loguru import logger
 from .config import settings
 
+# Source file of the standard logging module, skipped when looking for the caller
+LOGGING_FILE = logging.__file__
+
+# Stack depth from InterceptHandler.emit to the logging call, by call site
+_DEPTH_BY_CALL_SITE = {}
+
+# Whether setup_logging has already configured the sinks of this process
+_LOG_INITIALIZED = False
+
 
 class InterceptHandler(logging.Handler):
     """
@@ -22,11 +31,18 @@ class InterceptHandler(logging.Handler):
         except ValueError:
             level = record.levelno
 
-        # Find caller from where originated the logged message
-        frame, depth = logging.currentframe(), 2
-        while frame.f_code.co_filename == logging.__file__:
-            frame = frame.f_back
-            depth += 1
+        # Find caller from where originated the logged message. A call site
+        # always reaches emit through the same logging frames, so the search
+        # runs once per call site.
+        call_site = (record.pathname, record.lineno)
+        depth = _DEPTH_BY_CALL_SITE.get(call_site)
+        
+        if depth is None:
+            frame, depth = logging.currentframe(), 2
+            while frame and frame.f_code.co_filename == LOGGING_FILE:
+                frame = frame.f_back
+                depth += 1
+            _DEPTH_BY_CALL_SITE[call_site] = depth
 
         logger.opt(depth=depth, exception=record.exc_info).log(
             level, record.getMessage()
@@ -38,8 +54,16 @@ def setup_logging():
     Configure logging for the application.
     
     This function sets up Loguru as the main logging provider and
-    intercepts all standard library logging.
+    intercepts all standard library logging. Later calls return the
+    configured logger without adding sinks or rewiring standard logging again.
     """
+    global _LOG_INITIALIZED
+    
+    if _LOG_INITIALIZED:
+        return logger
+    
+    _LOG_INITIALIZED = True
+    
     # Remove default loguru handler
     logger.remove()
     
@@ -59,8 +83,8 @@ def setup_logging():
         colorize=True,
     )
     
-    # Add file handler for non-development environments
-    if settings.environment != "development":
+    # Add file handler for non-development environments, except under pytest
+    if settings.environment != "development" and "pytest" not in sys.modules:
         logger.add(
             "logs/blueprintgraph.log",
             rotation="10 MB",
@@ -70,13 +94,16 @@ def setup_logging():
             compression="zip",
         )
     
-    # Intercept standard logging
-    logging.basicConfig(handlers=[InterceptHandler()], level=0, force=True)
+    # Intercept standard logging. Loguru levels share the standard numbers, so
+    # records below the configured level are dropped by the standard library
+    # itself, before a record is built or the caller frame is searched.
+    min_level = logger.level(settings.log_level).no
+    logging.basicConfig(handlers=[InterceptHandler(level=min_level)], level=min_level, force=True)
     
     # Update logging levels for some noisy libraries
     for logger_name in ["uvicorn", "uvicorn.error", "fastapi"]:
         logging_logger = logging.getLogger(logger_name)
-        logging_logger.handlers = [InterceptHandler()]
+        logging_logger.handlers = [InterceptHandler(level=min_level)]
         logging_logger.propagate = False
     
     return logger
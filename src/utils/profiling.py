@@ -0,0 +1,89 @@
+"""
+Request phase profiling.
+
+Code on the request path wraps its work in `phase("name")`. When profiling is
+enabled, PhaseTimingMiddleware collects the time spent in each phase of a
+request, logs it when the response completes, and records it in Prometheus
+histograms exposed on /metrics.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+from prometheus_client import Histogram
+from .logging import log
+
+
+PHASE_SECONDS = Histogram(
+    "blueprintgraph_phase_seconds",
+    "Time spent in each phase of request handling",
+    ["phase"]
+)
+
+REQUEST_SECONDS = Histogram(
+    "blueprintgraph_request_seconds",
+    "Total time spent handling a request",
+    ["method"]
+)
+
+# Phase timings of the current request, or None when not profiling
+_phases: ContextVar[Optional[Dict[str, float]]] = ContextVar("phases", default=None)
+
+
+@contextmanager
+def phase(name: str):
+    """
+    Time a phase of the current request.
+
+    Does nothing when the request is not being profiled. The timings dict is
+    shared with worker threads started from the request, so phases run through
+    run_in_threadpool are recorded too.
+
+    Args:
+        name (str): Name of the phase; repeated phases are summed
+    """
+    phases = _phases.get()
+
+    if phases is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        phases[name] = phases.get(name, 0.0) + elapsed
+        PHASE_SECONDS.labels(phase=name).observe(elapsed)
+
+
+class PhaseTimingMiddleware:
+    """ASGI middleware that profiles the phases of each HTTP request."""
+
+    def __init__(self, app):
+        """
+        Initialize the middleware.
+
+        Args:
+            app: The ASGI application to wrap
+        """
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        phases = {}
+        token = _phases.set(phases)
+        start = time.perf_counter()
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            total = time.perf_counter() - start
+            _phases.reset(token)
+            REQUEST_SECONDS.labels(method=scope["method"]).observe(total)
+
+            timings = " ".join(f"{name}={seconds * 1000:.1f}ms" for name, seconds in phases.items())
+            log.info(f"request_profile: {scope['method']} {scope['path']} total={total * 1000:.1f}ms {timings}")
@@ -0,0 +1,137 @@
+"""
+Query result cache for read-only Cypher queries.
+"""
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+import orjson
+from .config import settings
+
+
+class QueryCache:
+    """
+    Bounded LRU cache of query results with a time-to-live.
+
+    Entries are keyed by the query text and its parameters. Writers call
+    `invalidate()` to bump a version counter that is part of every key, so
+    results read before a write are never served after it. A reader takes
+    `version` before running its query and passes it to `set()`, which drops
+    the result if a write invalidated the cache while the query was running.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = 30.0):
+        """
+        Initialize the query cache.
+
+        Args:
+            max_size (int, optional): Maximum number of cached results
+            ttl (float, optional): Time-to-live of a cached result in seconds
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._version = 0
+        self._hits = 0
+        self._misses = 0
+        # Queries run in worker threads, so guard with a thread lock
+        self._lock = threading.Lock()
+
+    @property
+    def version(self) -> int:
+        """Current cache version, to be passed to `set()` with a result read after it."""
+        with self._lock:
+            return self._version
+
+    def _key(self, query: str, parameters: Optional[Dict[str, Any]]) -> bytes:
+        """Build the cache key for a query and its parameters."""
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(str(self._version).encode())
+        digest.update(query.encode())
+        digest.update(orjson.dumps(parameters or {}, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS, default=str))
+        return digest.digest()
+
+    def get(self, query: str, parameters: Optional[Dict[str, Any]] = None) -> Optional[Any]:
+        """
+        Get the cached result of a query.
+
+        Args:
+            query (str): The Cypher query
+            parameters (dict, optional): Query parameters
+
+        Returns:
+            The cached result, or None if missing or expired
+        """
+        with self._lock:
+            key = self._key(query, parameters)
+            entry = self._entries.get(key)
+
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self._misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry[1]
+
+    def set(self, query: str, parameters: Optional[Dict[str, Any]], result: Any, version: Optional[int] = None) -> None:
+        """
+        Cache the result of a query.
+
+        Args:
+            query (str): The Cypher query
+            parameters (dict, optional): Query parameters
+            result: Query result to cache
+            version (int, optional): Cache version taken before the query ran;
+                the result is not cached if the cache was invalidated since
+        """
+        with self._lock:
+            if version is not None and version != self._version:
+                return
+
+            key = self._key(query, parameters)
+            self._entries[key] = (time.monotonic() + self.ttl, result)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self) -> None:
+        """Invalidate all cached results after a write."""
+        with self._lock:
+            self._version += 1
+            self._entries.clear()
+
+    def clear(self) -> None:
+        """Clear all cached results and reset the statistics."""
+        with self._lock:
+            self._version += 1
+            self._entries.clear()
+            self._hits = 0
+            self._misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get cache statistics.
+
+        Returns:
+            dict: Cache size, limits, and hit/miss counters
+        """
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self._hits,
+                "misses": self._misses
+            }
+
+
+# Create a global query cache instance
+query_cache = QueryCache(
+    max_size=settings.query_cache_max_size,
+    ttl=settings.query_cache_ttl
+)
@@ -0,0 +1,53 @@
+"""
+JSON serialization helpers backed by orjson.
+"""
+import hashlib
+from typing import Any, Dict
+import orjson
+
+
+def json_dumps(obj: Any) -> str:
+    """
+    Serialize an object to a JSON string.
+
+    Args:
+        obj: Object to serialize; values orjson cannot encode are converted with str()
+
+    Returns:
+        str: JSON string
+    """
+    return orjson.dumps(obj, default=str).decode("utf-8")
+
+
+def json_loads(data: Any) -> Any:
+    """
+    Deserialize a JSON string or bytes.
+
+    Args:
+        data: JSON string or bytes
+
+    Returns:
+        Deserialized object
+    """
+    return orjson.loads(data)
+
+
+def entity_id(entity: Dict[str, Any]) -> str:
+    """
+    Get the ID of an entity, deriving a stable one from its content if missing.
+
+    The derived ID is a hash of the entity with sorted keys, so the same entity
+    gets the same ID in every process (unlike the builtin hash(), which is
+    randomized per process).
+
+    Args:
+        entity: Entity data
+
+    Returns:
+        str: Entity ID
+    """
+    if "id" in entity:
+        return entity["id"]
+
+    content = orjson.dumps(entity, option=orjson.OPT_SORT_KEYS, default=str)
+    return hashlib.blake2b(content, digest_size=8).hexdigest()
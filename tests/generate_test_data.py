@@ -6,51 +6,58 @@ This script generates test data for manual testing of the Blueprint Graph OCSF D
 It can generate events in different formats (OCSF, syslog, CEF, LEEF) and send them to the API.
 """
 import os
-import json
 import random
 import argparse
 import datetime
+import orjson
 import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
 from typing import Dict, Any, List
 
 
+# Values the generators pick from, built once rather than on every call
+HOSTNAME_PREFIXES = ["web", "app", "db", "auth", "api", "mail", "proxy", "dns", "vpn", "fw"]
+HOSTNAME_DOMAINS = ["example.com", "test.org", "acme.co", "internal.net"]
+FIRST_NAMES = ["john", "jane", "bob", "alice", "dave", "sarah", "mike", "lisa"]
+LAST_NAMES = ["smith", "jones", "doe", "brown", "wilson", "taylor"]
+OCSF_EVENT_TYPES = [
+    {"class_uid": "0001", "category_uid": "0002", "type": "authentication"},
+    {"class_uid": "0003", "category_uid": "0001", "type": "process_execution"},
+    {"class_uid": "0004", "category_uid": "0002", "type": "network_connection"},
+    {"class_uid": "0005", "category_uid": "0003", "type": "privilege_escalation"},
+]
+
+
 def generate_ip() -> str:
     """Generate a random IP address."""
-    return f"{random.randint(1, 255)}.{random.randint(0, 255)}.{random.randint(0, 255)}.{random.randint(0, 255)}"
+    # Draw the last three octets at once from 24 random bits
+    bits = random.getrandbits(24)
+    return f"{random.randint(1, 255)}.{bits >> 16}.{(bits >> 8) & 255}.{bits & 255}"
 
 
 def generate_hostname() -> str:
     """Generate a random hostname."""
-    prefixes = ["web", "app", "db", "auth", "api", "mail", "proxy", "dns", "vpn", "fw"]
-    domains = ["example.com", "test.org", "acme.co", "internal.net"]
-    return f"{random.choice(prefixes)}-{random.randint(1, 99)}.{random.choice(domains)}"
+    return f"{random.choice(HOSTNAME_PREFIXES)}-{random.randint(1, 99)}.{random.choice(HOSTNAME_DOMAINS)}"
 
 
 def generate_username() -> str:
     """Generate a random username."""
-    first_names = ["john", "jane", "bob", "alice", "dave", "sarah", "mike", "lisa"]
-    last_names = ["smith", "jones", "doe", "brown", "wilson", "taylor"]
-    return f"{random.choice(first_names)}.{random.choice(last_names)}"
+    return f"{random.choice(FIRST_NAMES)}.{random.choice(LAST_NAMES)}"
 
 
 def generate_timestamp() -> str:
     """Generate a random timestamp within the last 24 hours."""
     now = datetime.datetime.now()
-    delta = datetime.timedelta(hours=random.randint(0, 23), minutes=random.randint(0, 59), seconds=random.randint(0, 59))
+    # One draw over every second of the day, the same distribution as separate hour, minute and second draws
+    delta = datetime.timedelta(seconds=random.randrange(24 * 60 * 60))
     timestamp = now - delta
     return timestamp.strftime("%Y-%m-%dT%H:%M:%SZ")
 
 
 def generate_ocsf_event() -> Dict[str, Any]:
     """Generate a random OCSF event."""
-    event_types = [
-        {"class_uid": "0001", "category_uid": "0002", "type": "authentication"},
-        {"class_uid": "0003", "category_uid": "0001", "type": "process_execution"},
-        {"class_uid": "0004", "category_uid": "0002", "type": "network_connection"},
-        {"class_uid": "0005", "category_uid": "0003", "type": "privilege_escalation"},
-    ]
-    
-    event_type = random.choice(event_types)
+    event_type = random.choice(OCSF_EVENT_TYPES)
     src_ip = generate_ip()
     dst_ip = generate_ip()
     username = generate_username()
@@ -173,55 +180,74 @@ def generate_leef_event() -> Dict[str, Any]:
     return event
 
 
+# Event generator for each format
+EVENT_GENERATORS = {
+    "ocsf": generate_ocsf_event,
+    "syslog": generate_syslog_event,
+    "cef": generate_cef_event,
+    "leef": generate_leef_event,
+}
+
+
 def generate_events(count: int, format_type: str) -> List[Dict[str, Any]]:
     """Generate a list of events in the specified format."""
-    events = []
+    # Pick the generator once instead of per event
+    generator = EVENT_GENERATORS.get(format_type)
     
-    for _ in range(count):
-        if format_type == "ocsf":
-            event = generate_ocsf_event()
-        elif format_type == "syslog":
-            event = generate_syslog_event()
-        elif format_type == "cef":
-            event = generate_cef_event()
-        elif format_type == "leef":
-            event = generate_leef_event()
-        else:
-            raise ValueError(f"Unsupported format: {format_type}")
-        
-        events.append(event)
+    if generator is None:
+        raise ValueError(f"Unsupported format: {format_type}")
     
-    return events
+    return [generator() for _ in range(count)]
 
 
 def save_events_to_file(events: List[Dict[str, Any]], filename: str):
     """Save events to a file."""
-    with open(filename, "w") as f:
-        json.dump(events, f, indent=2)
+    with open(filename, "wb") as f:
+        f.write(orjson.dumps(events, option=orjson.OPT_INDENT_2))
     
     print(f"Saved {len(events)} events to {filename}")
 
 
-def send_events_to_api(events: List[Dict[str, Any]], format_type: str, api_url: str):
-    """Send events to the API."""
+def send_events_to_api(
+    events: List[Dict[str, Any]],
+    format_type: str,
+    api_url: str,
+    batch_size: int = 100,
+    workers: int = 4
+):
+    """Send events to the API in batches, with several batches in flight at once."""
+    batches = [events[i:i + batch_size] for i in range(0, len(events), batch_size)]
+    
+    # Share keep-alive connections between the sending threads
+    session = requests.Session()
+    session.mount("http://", HTTPAdapter(pool_connections=workers, pool_maxsize=workers))
+    session.mount("https://", HTTPAdapter(pool_connections=workers, pool_maxsize=workers))
+    
+    def send_batch(batch: List[Dict[str, Any]]) -> int:
+        payload = [{"event": event, "source_format": format_type} for event in batch]
+        
+        response = session.post(
+            f"{api_url}/events/batch",
+            data=orjson.dumps(payload),
+            headers={"Content-Type": "application/json"}
+        )
+        
+        if response.status_code == 201:
+            return len(batch)
+        
+        print(f"Failed to send {len(batch)} events: {response.status_code} - {response.text}")
+        return 0
+    
     success_count = 0
     
-    for event in events:
-        try:
-            payload = {
-                "event": event,
-                "source_format": format_type
-            }
-            
-            response = requests.post(f"{api_url}/events", json=payload)
-            
-            if response.status_code == 201:
-                success_count += 1
-            else:
-                print(f"Failed to send event: {response.status_code} - {response.text}")
+    with session, ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(send_batch, batch) for batch in batches]
         
-        except Exception as e:
-            print(f"Error sending event: {str(e)}")
+        for future in as_completed(futures):
+            try:
+                success_count += future.result()
+            except Exception as e:
+                print(f"Error sending events: {str(e)}")
     
     print(f"Successfully sent {success_count} out of {len(events)} events to the API")
 
@@ -233,6 +259,8 @@ def main():
     parser.add_argument("--format", type=str, choices=["ocsf", "syslog", "cef", "leef", "all"], default="ocsf", help="Event format")
     parser.add_argument("--output", type=str, help="Output file (optional)")
     parser.add_argument("--api", type=str, help="API URL (optional)")
+    parser.add_argument("--batch-size", type=int, default=100, help="Number of events per API request")
+    parser.add_argument("--workers", type=int, default=4, help="Number of concurrent API requests")
     
     args = parser.parse_args()
     
@@ -247,7 +275,7 @@ def main():
             
             if args.api:
                 print(f"Sending {format_type} events to API...")
-                send_events_to_api(events, format_type, args.api)
+                send_events_to_api(events, format_type, args.api, args.batch_size, args.workers)
         
         if args.output:
             save_events_to_file(all_events, args.output)
@@ -261,7 +289,7 @@ def main():
         
         if args.api:
             print(f"Sending events to API...")
-            send_events_to_api(events, args.format, args.api)
+            send_events_to_api(events, args.format, args.api, args.batch_size, args.workers)
 
 
 if __name__ == "__main__":
@@ -2,56 +2,60 @@
 Pytest configuration for integration tests.
 """
 import os
-import time
 import pytest
-import docker
 import requests
 from fastapi.testclient import TestClient
 from neo4j import GraphDatabase
+from testcontainers.core.config import testcontainers_config
+from testcontainers.neo4j import Neo4jContainer
 
 from src.api.main import app
-from src.utils import settings
+from src.core import detection_engine, create_indexes
+from src.utils import settings, query_cache, db
+
+# Delete every node in batches of their own transactions, so large fixtures
+# never build one huge transaction state. It needs an auto-commit transaction.
+CLEAN_DATABASE_QUERY = """
+MATCH (n)
+CALL { WITH n DETACH DELETE n } IN TRANSACTIONS OF 10000 ROWS
+"""
+
+# Seconds to wait for Neo4j to accept connections. The first start downloads
+# the APOC plugin, which takes longer than the library's default wait.
+NEO4J_STARTUP_TIMEOUT = 300
 
 
 @pytest.fixture(scope="session")
 def neo4j_container():
-    """Start a Neo4j container for testing."""
-    client = docker.from_env()
-    
-    # Check if container already exists and remove it
-    try:
-        container = client.containers.get("blueprintgraph-test-neo4j")
-        container.remove(force=True)
-    except docker.errors.NotFound:
-        pass
-    
-    # Start a new container
-    container = client.containers.run(
-        "neo4j:5.13.0",
-        name="blueprintgraph-test-neo4j",
-        ports={"7474/tcp": 7475, "7687/tcp": 7688},
-        environment={
-            "NEO4J_AUTH": "neo4j/testpassword",
-            "NEO4J_dbms_memory_heap_initial__size": "512m",
-            "NEO4J_dbms_memory_heap_max__size": "1G",
-        },
-        detach=True,
-    )
+    """
+    Start a Neo4j container for testing.
     
-    # Wait for Neo4j to start
-    time.sleep(10)
+    The container is published on a free host port and is ready as soon as
+    Bolt accepts connections, so there is no fixed startup wait.
+    """
+    testcontainers_config.max_tries = NEO4J_STARTUP_TIMEOUT // testcontainers_config.sleep_time
     
-    yield container
+    container = (
+        Neo4jContainer("neo4j:5.13.0", password="testpassword")
+        .with_env("NEO4J_dbms_memory_heap_initial__size", "512m")
+        .with_env("NEO4J_dbms_memory_heap_max__size", "1G")
+        .with_env("NEO4J_PLUGINS", '["apoc"]')
+    )
     
-    # Cleanup
-    container.remove(force=True)
+    with container:
+        yield container
 
 
 @pytest.fixture(scope="session")
 def neo4j_connection(neo4j_container):
     """Create a Neo4j connection for testing."""
-    uri = "bolt://localhost:7688"
-    driver = GraphDatabase.driver(uri, auth=("neo4j", "testpassword"))
+    uri = neo4j_container.get_connection_url()
+    driver = GraphDatabase.driver(
+        uri,
+        auth=(neo4j_container.username, neo4j_container.password),
+        max_connection_pool_size=32,
+        connection_acquisition_timeout=30
+    )
     
     # Test the connection
     with driver.session() as session:
@@ -64,24 +68,64 @@ def neo4j_connection(neo4j_container):
     driver.close()
 
 
-@pytest.fixture(scope="function")
-def test_client(neo4j_connection):
-    """Create a FastAPI test client."""
+@pytest.fixture(scope="session")
+def neo4j_settings(neo4j_container):
+    """
+    Point the application's database connection at the test container.
+    
+    The application connects once with these settings and keeps its driver
+    for the whole session.
+    """
+    original = (settings.neo4j_uri, settings.neo4j_user, settings.neo4j_password)
+    
     # Override settings for testing
-    settings.neo4j_uri = "bolt://localhost:7688"
-    settings.neo4j_user = "neo4j"
-    settings.neo4j_password = "testpassword"
+    settings.neo4j_uri = neo4j_container.get_connection_url()
+    settings.neo4j_user = neo4j_container.username
+    settings.neo4j_password = neo4j_container.password
+    
+    # Drop any connection made with other settings
+    db.close()
     
+    # Index the graph as the services do on startup; indexes survive clean_database
+    assert create_indexes()
+    
+    yield
+    
+    db.close()
+    settings.neo4j_uri, settings.neo4j_user, settings.neo4j_password = original
+
+
+@pytest.fixture(scope="session")
+def test_client(neo4j_settings, neo4j_connection):
+    """
+    Create a FastAPI test client shared by all tests.
+    
+    Tests are isolated by clean_database, so the app and client are built once.
+    """
     # Create test client
     client = TestClient(app)
     
     yield client
 
 
+@pytest.fixture(autouse=True)
+def reset_detection_rules():
+    """Start and end every test with no detection rules loaded."""
+    detection_engine.clear_rules()
+    
+    yield
+    
+    detection_engine.clear_rules()
+
+
 @pytest.fixture(scope="function")
-def clean_database(neo4j_connection):
+def clean_database(neo4j_settings, neo4j_connection):
     """Clean the database before each test."""
+    # Truncate in place on the shared driver; the container lives for the whole session
     with neo4j_connection.session() as session:
-        session.run("MATCH (n) DETACH DELETE n")
+        session.run(CLEAN_DATABASE_QUERY).consume()
+    
+    # Tests write to the database directly, bypassing cache invalidation
+    query_cache.clear()
     
     yield 
\ No newline at end of file
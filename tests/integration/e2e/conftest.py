@@ -9,9 +9,9 @@ import time
 import subprocess
 import pytest
 import docker
-import requests
 import yaml
 import tempfile
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_EXCEPTION
 from pathlib import Path
 from neo4j import GraphDatabase
 
@@ -21,6 +21,7 @@ COMPOSE_FILE = PROJECT_ROOT / "docker-compose.yml"
 TEST_NETWORK_NAME = "blueprintgraph_test_network"
 TEST_PROJECT_NAME = "blueprintgraph_test"
 TEST_CONTAINER_PREFIX = "e2e_test_"  # Prefix for test container names
+OVERRIDE_FILE = Path(tempfile.gettempdir()) / "blueprintgraph-e2e" / "docker-compose-test.yml"
 
 # Test-specific ports (different from development ports to avoid conflicts)
 API_PORT = 18001
@@ -31,10 +32,35 @@ NEO4J_BOLT_PORT = 17688
 ZOOKEEPER_PORT = 12181
 KAFKA_UI_PORT = 18080
 
+# Remove the services' volumes on teardown. By default they are kept, so the
+# Neo4j plugins installed on first start are reused by later sessions.
+WIPE_VOLUMES = os.environ.get("E2E_WIPE_VOLUMES", "").lower() in ("1", "true", "yes")
+
+# Leave the services running after the test session, so the next session can
+# reuse them instead of starting the stack again
+KEEP_UP = os.environ.get("E2E_KEEP_UP", "").lower() in ("1", "true", "yes")
+
+# Build the API and consumer images with BuildKit, embedding layer cache metadata
+# in the images so later builds can reuse their layers
+BUILD_ENV = {**os.environ, "DOCKER_BUILDKIT": "1", "COMPOSE_DOCKER_CLI_BUILD": "1"}
+
 # Neo4j credentials
 NEO4J_USER = "neo4j"
 NEO4J_PASSWORD = "blueprintgraph"
 
+# Health is checked by Docker inside the containers; the fixture only polls
+# the health status Docker reports
+HEALTH_CHECK_TIMEOUT = 90
+HEALTH_CHECK_POLL_INTERVAL = 0.2
+
+# Containers with a health check, waited for before the tests run. The API is
+# checked through /health only, as /health/kafka produces a test message.
+HEALTH_CHECKED_CONTAINERS = [
+    f"{TEST_CONTAINER_PREFIX}neo4j",
+    f"{TEST_CONTAINER_PREFIX}kafka",
+    f"{TEST_CONTAINER_PREFIX}api",
+]
+
 
 @pytest.fixture(scope="session")
 def docker_client():
@@ -69,23 +95,35 @@ def docker_network(docker_client):
 @pytest.fixture(scope="session")
 def docker_compose_override():
     """
-    Create a temporary docker-compose override file with test-specific ports.
-    """
-    # Create a temporary file for the docker-compose override
-    fd, path = tempfile.mkstemp(prefix="docker-compose-test-", suffix=".yml")
-    override_path = Path(path)
+    Write the docker-compose override file with test-specific ports.
+    
+    The file lives at a fixed path and is kept between sessions, so a stack
+    left up with E2E_KEEP_UP can still be managed with the same compose files.
     
-    # Write the override configuration to the file
-    with open(fd, "w") as f:
-        f.write(f"""version: '3'
+    Neo4j keeps its data and logs in tmpfs mounts replacing the named volumes,
+    so test writes never wait on the disk and every container starts empty.
+    """
+    content = f"""version: '3.8'
 services:
   neo4j:
     container_name: {TEST_CONTAINER_PREFIX}neo4j
     ports:
       - "{NEO4J_HTTP_PORT}:7474"
       - "{NEO4J_BOLT_PORT}:7687"
+    volumes:
+      - type: tmpfs
+        target: /data
+      - type: tmpfs
+        target: /logs
     environment:
       - NEO4J_AUTH={NEO4J_USER}/{NEO4J_PASSWORD}
+      - NEO4J_db_tx__log_rotation_retention__policy=false
+    healthcheck:
+      test: ["CMD-SHELL", "cypher-shell -u {NEO4J_USER} -p {NEO4J_PASSWORD} 'RETURN 1' || exit 1"]
+      interval: 1s
+      timeout: 10s
+      retries: 60
+      start_period: 5s
 
   zookeeper:
     container_name: {TEST_CONTAINER_PREFIX}zookeeper
@@ -102,11 +140,26 @@ services:
       - KAFKA_LISTENER_SECURITY_PROTOCOL_MAP=PLAINTEXT:PLAINTEXT,PLAINTEXT_HOST:PLAINTEXT
       - KAFKA_LISTENERS=PLAINTEXT://0.0.0.0:9092,PLAINTEXT_HOST://0.0.0.0:29092
       - KAFKA_ZOOKEEPER_CONNECT=zookeeper:2181
+    healthcheck:
+      test: ["CMD-SHELL", "kafka-broker-api-versions --bootstrap-server localhost:9092 > /dev/null || exit 1"]
+      interval: 1s
+      timeout: 10s
+      retries: 60
+      start_period: 5s
 
   api:
     container_name: {TEST_CONTAINER_PREFIX}api
+    build:
+      args:
+        BUILDKIT_INLINE_CACHE: "1"
     ports:
       - "{API_PORT}:8000"
+    healthcheck:
+      test: ["CMD-SHELL", "curl -sf http://localhost:8000/health | grep -q '\\"status\\":\\"healthy\\"'"]
+      interval: 1s
+      timeout: 5s
+      retries: 60
+      start_period: 5s
     environment:
       - NEO4J_URI=bolt://neo4j:7687
       - NEO4J_USER={NEO4J_USER}
@@ -115,6 +168,9 @@ services:
 
   kafka-consumer:
     container_name: {TEST_CONTAINER_PREFIX}kafka-consumer
+    build:
+      args:
+        BUILDKIT_INLINE_CACHE: "1"
     environment:
       - NEO4J_URI=bolt://neo4j:7687
       - NEO4J_USER={NEO4J_USER}
@@ -127,15 +183,16 @@ services:
       - "{KAFKA_UI_PORT}:8080"
     environment:
       - KAFKA_CLUSTERS_0_BOOTSTRAPSERVERS=kafka:9092
-""")
+"""
     
-    print(f"Created docker-compose override file: {override_path}")
+    # Only rewrite the file when the configuration changed
+    OVERRIDE_FILE.parent.mkdir(parents=True, exist_ok=True)
     
-    yield override_path
+    if not OVERRIDE_FILE.exists() or OVERRIDE_FILE.read_text() != content:
+        OVERRIDE_FILE.write_text(content)
+        print(f"Wrote docker-compose override file: {OVERRIDE_FILE}")
     
-    # Clean up the temporary file
-    os.unlink(override_path)
-    print(f"Removed docker-compose override file: {override_path}")
+    return OVERRIDE_FILE
 
 
 @pytest.fixture(scope="session")
@@ -145,9 +202,30 @@ def e2e_services(docker_client, docker_network, docker_compose_override):
 
     This fixture uses docker-compose to start Neo4j, Kafka, Zookeeper,
     the API, and the Kafka consumer with test-specific ports to avoid conflicts.
+    When the services are already running and healthy, e.g. left up by a
+    previous session with E2E_KEEP_UP set, they are reused as they are.
     """
     try:
+        if services_healthy(docker_client):
+            print("Reusing running E2E test services")
+            yield
+            return
+        
         print("Starting E2E test services...")
+        
+        # Pull the prebuilt images all at once instead of one by one as up
+        # starts each service; up then only builds the API and consumer images
+        cmd = [
+            "docker-compose",
+            "-f", str(COMPOSE_FILE),
+            "-f", str(docker_compose_override),
+            "-p", TEST_PROJECT_NAME,
+            "pull",
+            "--parallel",
+            "neo4j", "zookeeper", "kafka", "kafka-ui"
+        ]
+        
+        subprocess.run(cmd)
 
         # Use docker-compose with override file and test project name
         cmd = [
@@ -160,95 +238,87 @@ def e2e_services(docker_client, docker_network, docker_compose_override):
             "neo4j", "zookeeper", "kafka", "api", "kafka-consumer", "kafka-ui"
         ]
 
-        subprocess.run(cmd, check=True)
+        subprocess.run(cmd, check=True, env=BUILD_ENV)
 
-        # Wait for services to be healthy
-        wait_for_api_health(f"http://localhost:{API_PORT}/health")
-        wait_for_neo4j_health(f"bolt://localhost:{NEO4J_BOLT_PORT}", NEO4J_USER, NEO4J_PASSWORD)
-        wait_for_kafka_health(f"http://localhost:{API_PORT}/health/kafka")
+        # Wait for services to be healthy, polling all of them at once so the
+        # wait is as long as the slowest service rather than their sum
+        with ThreadPoolExecutor(max_workers=len(HEALTH_CHECKED_CONTAINERS)) as executor:
+            futures = [
+                executor.submit(wait_for_container_health, docker_client, container_name)
+                for container_name in HEALTH_CHECKED_CONTAINERS
+            ]
+            done, _ = wait(futures, return_when=FIRST_EXCEPTION)
+            
+            for future in done:
+                future.result()
 
         yield
     except Exception as e:
         print(f"Error setting up E2E services: {e}")
         raise
     finally:
-        print("Tearing down E2E test services...")
-        
-        # Use docker-compose to tear down all services
-        cmd = [
-            "docker-compose",
-            "-f", str(COMPOSE_FILE),
-            "-f", str(docker_compose_override),
-            "-p", TEST_PROJECT_NAME,
-            "down",
-            "-v"  # Remove volumes
-        ]
-        
-        subprocess.run(cmd)
+        if KEEP_UP:
+            print("Leaving E2E test services running")
+        else:
+            print("Tearing down E2E test services...")
+            
+            # Use docker-compose to tear down all services
+            cmd = [
+                "docker-compose",
+                "-f", str(COMPOSE_FILE),
+                "-f", str(docker_compose_override),
+                "-p", TEST_PROJECT_NAME,
+                "down"
+            ]
+            
+            if WIPE_VOLUMES:
+                cmd.append("-v")  # Remove volumes
+            
+            subprocess.run(cmd)
 
 
-def wait_for_api_health(health_url, max_retries=30, retry_interval=2):
+@pytest.fixture(scope="session")
+def neo4j_driver(e2e_services):
     """
-    Wait for the API to be healthy.
+    Create a Neo4j driver shared by all E2E tests.
     """
-    print(f"Waiting for API to be healthy at {health_url}...")
+    driver = GraphDatabase.driver(
+        f"bolt://localhost:{NEO4J_BOLT_PORT}",
+        auth=(NEO4J_USER, NEO4J_PASSWORD)
+    )
     
-    for i in range(max_retries):
-        try:
-            response = requests.get(health_url, timeout=5)
-            if response.status_code == 200 and response.json().get("status") == "healthy":
-                print("API is healthy!")
-                return True
-        except requests.RequestException:
-            pass
-        
-        print(f"API not healthy yet, retrying in {retry_interval}s... ({i+1}/{max_retries})")
-        time.sleep(retry_interval)
+    yield driver
     
-    raise Exception(f"API health check failed after {max_retries} retries")
+    driver.close()
 
 
-def wait_for_neo4j_health(bolt_uri, user, password, max_retries=30, retry_interval=2):
+def services_healthy(docker_client):
     """
-    Wait for Neo4j to be healthy.
+    Check whether all health-checked E2E containers are running and healthy.
     """
-    print(f"Waiting for Neo4j to be healthy at {bolt_uri}...")
+    running = docker_client.containers.list(filters={"name": TEST_CONTAINER_PREFIX, "status": "running"})
+    health = {container.name: container.attrs["State"].get("Health", {}).get("Status") for container in running}
     
-    for i in range(max_retries):
-        try:
-            driver = GraphDatabase.driver(bolt_uri, auth=(user, password))
-            with driver.session() as session:
-                result = session.run("RETURN 1 as n")
-                if result.single()["n"] == 1:
-                    print("Neo4j is healthy!")
-                    driver.close()
-                    return True
-            driver.close()
-        except Exception:
-            pass
-        
-        print(f"Neo4j not healthy yet, retrying in {retry_interval}s... ({i+1}/{max_retries})")
-        time.sleep(retry_interval)
-    
-    raise Exception(f"Neo4j health check failed after {max_retries} retries")
+    return all(health.get(container_name) == "healthy" for container_name in HEALTH_CHECKED_CONTAINERS)
 
 
-def wait_for_kafka_health(health_url, max_retries=30, retry_interval=2):
+def wait_for_container_health(docker_client, container_name, timeout=HEALTH_CHECK_TIMEOUT):
     """
-    Wait for Kafka to be healthy.
+    Wait for a container's Docker health check to report it healthy.
     """
-    print(f"Waiting for Kafka to be healthy at {health_url}...")
+    print(f"Waiting for {container_name} to be healthy...")
     
-    for i in range(max_retries):
-        try:
-            response = requests.get(health_url, timeout=5)
-            if response.status_code == 200 and response.json().get("status") == "healthy":
-                print("Kafka is healthy!")
-                return True
-        except requests.RequestException:
-            pass
+    container = docker_client.containers.get(container_name)
+    deadline = time.monotonic() + timeout
+    
+    while time.monotonic() < deadline:
+        container.reload()
+        health = container.attrs["State"].get("Health", {}).get("Status")
+        
+        if health == "healthy":
+            print(f"{container_name} is healthy!")
+            return True
         
-        print(f"Kafka not healthy yet, retrying in {retry_interval}s... ({i+1}/{max_retries})")
-        time.sleep(retry_interval)
+        time.sleep(HEALTH_CHECK_POLL_INTERVAL)
     
-    raise Exception(f"Kafka health check failed after {max_retries} retries") 
\ No newline at end of file
+    raise Exception(f"{container_name} health check failed after {timeout}s")
@@ -9,15 +9,11 @@ import pytest
 import requests
 import json
 import time
-from py2neo import Graph
 # Use absolute imports instead of relative imports
-from tests.integration.e2e.conftest import (
-    API_PORT, NEO4J_BOLT_PORT, 
-    NEO4J_USER, NEO4J_PASSWORD
-)
+from tests.integration.e2e.conftest import API_PORT
 
 
-def test_kafka_e2e_flow(e2e_services):
+def test_kafka_e2e_flow(e2e_services, neo4j_driver):
     """
     Test the end-to-end flow of the API and Neo4j connection.
     
@@ -44,13 +40,8 @@ def test_kafka_e2e_flow(e2e_services):
     assert kafka_health["status"] == "healthy", f"Kafka connection failed: {kafka_health}"
     
     # Verify Neo4j connection directly
-    graph = Graph(
-        f"bolt://localhost:{NEO4J_BOLT_PORT}", 
-        auth=(NEO4J_USER, NEO4J_PASSWORD)
-    )
-    
-    # Run a simple query to verify connection
-    result = graph.run("RETURN 1 as n").data()
+    with neo4j_driver.session() as session:
+        result = session.run("RETURN 1 as n").data()
     assert result[0]['n'] == 1, "Failed to execute query on Neo4j"
     
     print("E2E test successful: API is healthy, Neo4j connection is working, and Kafka is healthy") 
\ No newline at end of file
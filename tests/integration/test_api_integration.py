@@ -6,6 +6,31 @@ import pytest
 from fastapi import status
 
 
+# Rule created by the created_rule fixture
+RULE_DATA = {
+    "name": "Test Rule",
+    "description": "A test rule for integration testing",
+    "severity": 5,
+    "query": "MATCH (n) RETURN n LIMIT 10",
+    "tags": ["test", "integration"],
+    "mitre_techniques": ["T1234"],
+    "enabled": True
+}
+
+
+@pytest.fixture
+def created_rule(test_client, clean_database):
+    """Create the RULE_DATA rule, deleting it after the test."""
+    response = test_client.post("/rules", json=RULE_DATA)
+    assert response.status_code == status.HTTP_201_CREATED
+    
+    rule = response.json()
+    
+    yield rule
+    
+    test_client.delete(f"/rules/{rule['rule_id']}")
+
+
 class TestHealthEndpoint:
     """Tests for the health endpoint."""
     
@@ -20,23 +45,8 @@ class TestHealthEndpoint:
 class TestRulesEndpoints:
     """Tests for the rules endpoints."""
     
-    def test_create_and_get_rule(self, test_client, clean_database):
+    def test_create_and_get_rule(self, test_client, created_rule):
         """Test creating and retrieving a rule."""
-        # Create a rule
-        rule_data = {
-            "name": "Test Rule",
-            "description": "A test rule for integration testing",
-            "severity": 5,
-            "query": "MATCH (n) RETURN n LIMIT 10",
-            "tags": ["test", "integration"],
-            "mitre_techniques": ["T1234"],
-            "enabled": True
-        }
-        
-        response = test_client.post("/rules", json=rule_data)
-        assert response.status_code == status.HTTP_201_CREATED
-        
-        created_rule = response.json()
         rule_id = created_rule["rule_id"]
         
         # Get the rule
@@ -44,31 +54,35 @@ class TestRulesEndpoints:
         assert response.status_code == 200
         
         retrieved_rule = response.json()
-        assert retrieved_rule["name"] == rule_data["name"]
-        assert retrieved_rule["description"] == rule_data["description"]
-        assert retrieved_rule["severity"] == rule_data["severity"]
-        assert retrieved_rule["query"] == rule_data["query"]
-        assert retrieved_rule["tags"] == rule_data["tags"]
-        assert retrieved_rule["mitre_techniques"] == rule_data["mitre_techniques"]
-        assert retrieved_rule["enabled"] == rule_data["enabled"]
+        assert retrieved_rule["name"] == RULE_DATA["name"]
+        assert retrieved_rule["description"] == RULE_DATA["description"]
+        assert retrieved_rule["severity"] == RULE_DATA["severity"]
+        assert retrieved_rule["query"] == RULE_DATA["query"]
+        assert retrieved_rule["tags"] == RULE_DATA["tags"]
+        assert retrieved_rule["mitre_techniques"] == RULE_DATA["mitre_techniques"]
+        assert retrieved_rule["enabled"] == RULE_DATA["enabled"]
     
-    def test_update_rule(self, test_client, clean_database):
-        """Test updating a rule."""
-        # Create a rule
+    def test_create_rule_with_invalid_query(self, test_client, clean_database):
+        """Test that rules with invalid Cypher are rejected."""
         rule_data = {
-            "name": "Test Rule",
-            "description": "A test rule for integration testing",
+            "name": "Invalid Rule",
+            "description": "A rule with a syntax error",
             "severity": 5,
-            "query": "MATCH (n) RETURN n LIMIT 10",
-            "tags": ["test", "integration"],
-            "mitre_techniques": ["T1234"],
+            "query": "MATCH (n RETURN n",
+            "tags": ["test"],
+            "mitre_techniques": [],
             "enabled": True
         }
         
         response = test_client.post("/rules", json=rule_data)
-        assert response.status_code == status.HTTP_201_CREATED
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
         
-        created_rule = response.json()
+        # The rule was not loaded
+        response = test_client.get("/rules?tag=test")
+        assert all(rule["name"] != "Invalid Rule" for rule in response.json())
+    
+    def test_update_rule(self, test_client, created_rule):
+        """Test updating a rule."""
         rule_id = created_rule["rule_id"]
         
         # Update the rule
@@ -94,23 +108,8 @@ class TestRulesEndpoints:
         assert updated_rule["mitre_techniques"] == updated_rule_data["mitre_techniques"]
         assert updated_rule["enabled"] == updated_rule_data["enabled"]
     
-    def test_delete_rule(self, test_client, clean_database):
+    def test_delete_rule(self, test_client, created_rule):
         """Test deleting a rule."""
-        # Create a rule
-        rule_data = {
-            "name": "Test Rule",
-            "description": "A test rule for integration testing",
-            "severity": 5,
-            "query": "MATCH (n) RETURN n LIMIT 10",
-            "tags": ["test", "integration"],
-            "mitre_techniques": ["T1234"],
-            "enabled": True
-        }
-        
-        response = test_client.post("/rules", json=rule_data)
-        assert response.status_code == status.HTTP_201_CREATED
-        
-        created_rule = response.json()
         rule_id = created_rule["rule_id"]
         
         # Delete the rule
@@ -144,20 +143,22 @@ class TestRulesEndpoints:
             "enabled": False
         }
         
-        test_client.post("/rules", json=rule_data_1)
-        test_client.post("/rules", json=rule_data_2)
+        response = test_client.post("/rules/batch", json=[rule_data_1, rule_data_2])
+        assert response.status_code == status.HTTP_201_CREATED
+        assert [rule["name"] for rule in response.json()] == [rule_data_1["name"], rule_data_2["name"]]
         
         # List all rules
         response = test_client.get("/rules")
         assert response.status_code == 200
         rules = response.json()
-        assert len(rules) == 4
+        assert len(rules) == 2
         
         # Filter by enabled status
         response = test_client.get("/rules?enabled=true")
         assert response.status_code == 200
         rules = response.json()
-        assert len(rules) == 2
+        assert len(rules) == 1
+        assert rules[0]["name"] == "Test Rule 1"
         
         # Filter by tag
         response = test_client.get("/rules?tag=advanced")
@@ -245,6 +246,72 @@ class TestEventsEndpoints:
         assert "metadata" in retrieved_event["event"]
         assert retrieved_event["event"]["message"] == event_data["event"]["message"]
 
+    def test_create_event_batch(self, test_client, neo4j_connection, clean_database):
+        """Test creating a batch of events in one request."""
+        events_data = [
+            {
+                "event": {
+                    "class_uid": "0001",
+                    "category_uid": "0002",
+                    "time": "2023-01-01T12:00:00Z",
+                    "severity": 5,
+                    "message": "Test event 1",
+                    "metadata": {"version": "1.0.0", "product": {"name": "Test Product"}},
+                    "src": {"id": "src-001", "type": "IP", "ip": "192.168.1.100"}
+                },
+                "source_format": "ocsf"
+            },
+            {
+                "event": {
+                    "class_uid": "0001",
+                    "category_uid": "0002",
+                    "time": "2023-01-01T12:05:00Z",
+                    "severity": 5,
+                    "message": "Test event 2",
+                    "metadata": {"version": "1.0.0", "product": {"name": "Test Product"}},
+                    "src": {"id": "src-001", "type": "IP", "ip": "192.168.1.100"},
+                    "dst": {"id": "host-001", "type": "Host", "hostname": "test-host"}
+                },
+                "source_format": "ocsf"
+            },
+            {
+                "event": {
+                    "facility": 1,
+                    "severity": 3,
+                    "timestamp": "2023-01-01T12:10:00Z",
+                    "hostname": "test-host",
+                    "message": "Test syslog message"
+                },
+                "source_format": "syslog"
+            }
+        ]
+
+        response = test_client.post("/events/batch", json=events_data)
+        assert response.status_code == status.HTTP_201_CREATED
+
+        created_events = response.json()
+        assert len(created_events) == 3
+        assert [e["event"]["message"] for e in created_events] == [
+            "Test event 1", "Test event 2", "Test syslog message"
+        ]
+
+        # Every returned ID resolves to the matching event
+        for created_event in created_events:
+            response = test_client.get(f"/events/{created_event['id']}")
+            assert response.status_code == 200
+            assert response.json()["event"]["message"] == created_event["event"]["message"]
+
+        # Verify entities were merged rather than duplicated
+        with neo4j_connection.session() as session:
+            result = session.run("MATCH (s:IP {id: 'src-001'})-[:GENERATED]->(e:Event) RETURN count(e) as count")
+            assert result.single()["count"] == 2
+
+            result = session.run("MATCH (s:IP {id: 'src-001'}) RETURN count(s) as count")
+            assert result.single()["count"] == 1
+
+            result = session.run("MATCH (e:Event)-[:TARGETS]->(d:Host {id: 'host-001'}) RETURN count(e) as count")
+            assert result.single()["count"] == 1
+
 
 class TestDetectionEndpoints:
     """Tests for the detection endpoints."""
@@ -255,19 +322,13 @@ class TestDetectionEndpoints:
         with neo4j_connection.session() as session:
             session.run("""
             CREATE (src:IP {id: 'ip-001', ip: '192.168.1.100'})
-            CREATE (e1:Event {class_uid: '0001', category_uid: '0002', time: '2023-01-01T12:00:00Z', severity: 5})
-            CREATE (e2:Event {class_uid: '0001', category_uid: '0002', time: '2023-01-01T12:05:00Z', severity: 5})
-            CREATE (e3:Event {class_uid: '0001', category_uid: '0002', time: '2023-01-01T12:10:00Z', severity: 5})
-            CREATE (e4:Event {class_uid: '0001', category_uid: '0002', time: '2023-01-01T12:15:00Z', severity: 5})
-            CREATE (e5:Event {class_uid: '0001', category_uid: '0002', time: '2023-01-01T12:20:00Z', severity: 5})
-            CREATE (e6:Event {class_uid: '0001', category_uid: '0002', time: '2023-01-01T12:25:00Z', severity: 5})
-            CREATE (src)-[:GENERATED]->(e1)
-            CREATE (src)-[:GENERATED]->(e2)
-            CREATE (src)-[:GENERATED]->(e3)
-            CREATE (src)-[:GENERATED]->(e4)
-            CREATE (src)-[:GENERATED]->(e5)
-            CREATE (src)-[:GENERATED]->(e6)
-            """)
+            WITH src
+            UNWIND $events AS ev
+            CREATE (src)-[:GENERATED]->(:Event {class_uid: ev.class_uid, category_uid: ev.category_uid, time: ev.time, severity: ev.severity})
+            """, events=[
+                {"class_uid": "0001", "category_uid": "0002", "time": f"2023-01-01T12:{minute:02d}:00Z", "severity": 5}
+                for minute in range(0, 30, 5)
+            ])
         
         # Create a rule
         rule_data = {
@@ -336,20 +397,57 @@ class TestDetectionEndpoints:
             "enabled": True
         }
         
-        test_client.post("/rules", json=rule_data_1)
-        test_client.post("/rules", json=rule_data_2)
+        response = test_client.post("/rules/batch", json=[rule_data_1, rule_data_2])
+        assert response.status_code == status.HTTP_201_CREATED
+        assert [rule["name"] for rule in response.json()] == [rule_data_1["name"], rule_data_2["name"]]
         
         # Run all rules
         response = test_client.post("/run-detection")
         assert response.status_code == 200
         
         alerts = response.json()
-        assert len(alerts) == 12  # Updated to expect 12 alerts
+        assert len(alerts) == 2
+        assert sorted(alert["severity"] for alert in alerts) == [5, 9]
         
         # Verify alerts were stored in the database
         with neo4j_connection.session() as session:
             result = session.run("MATCH (a:Alert) RETURN count(a) as count")
-            assert result.single()["count"] == 12  # Updated to expect 12 alerts
+            assert result.single()["count"] == 2
+
+    
+    def test_run_detection_with_unstorable_alert(self, test_client, neo4j_connection, clean_database):
+        """Test that an alert failing to store is reported without losing the others."""
+        with neo4j_connection.session() as session:
+            session.run("""
+            CREATE (:IP {id: 'ip-001', ip: '192.168.1.100'})-[:GENERATED]->(:Event {class_uid: '0001', category_uid: '0002', severity: 5})
+            """)
+        
+        good_rule = {
+            "name": "Authentication Events",
+            "description": "Detect authentication events",
+            "severity": 5,
+            "query": "MATCH (src:IP)-[:GENERATED]->(e:Event) WHERE e.class_uid = '0001' RETURN src, e"
+        }
+        
+        # The returned map becomes an entity with a nested map property, which Neo4j cannot store
+        bad_rule = {
+            "name": "Unstorable Entity",
+            "description": "Return an entity that cannot be stored",
+            "severity": 9,
+            "query": "RETURN {id: 'bad-001', details: {nested: true}} AS info"
+        }
+        
+        response = test_client.post("/rules/batch", json=[good_rule, bad_rule])
+        assert response.status_code == status.HTTP_201_CREATED
+        
+        response = test_client.post("/run-detection")
+        assert response.status_code == 500
+        assert response.json()["detail"] == "Failed to store 1 of 2 alerts"
+        
+        # The alert of the good rule was still stored
+        with neo4j_connection.session() as session:
+            result = session.run("MATCH (a:Alert) RETURN a.severity as severity")
+            assert [record["severity"] for record in result] == [5]
 
 
 class TestAlertsEndpoints:
@@ -394,4 +492,92 @@ class TestAlertsEndpoints:
         # Verify entities are included
         assert len(alerts[0]["entities"]) == 1
         assert alerts[0]["entities"][0]["type"] == "IP"
-        assert alerts[0]["entities"][0]["id"] == "ip-001" 
\ No newline at end of file
+        assert alerts[0]["entities"][0]["id"] == "ip-001"
+    
+    def test_get_alerts_empty(self, test_client, clean_database):
+        """Test that an empty alert stream is a valid, empty JSON array."""
+        response = test_client.get("/alerts")
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/json"
+        assert response.json() == []
+    
+    def test_get_alerts_schema(self, test_client):
+        """Test that the streamed /alerts response is documented as a list of alerts."""
+        schema = test_client.get("/openapi.json").json()
+        content = schema["paths"]["/alerts"]["get"]["responses"]["200"]["content"]["application/json"]
+        
+        assert content["schema"]["type"] == "array"
+        assert content["schema"]["items"]["$ref"] == "#/components/schemas/AlertResponse"
+
+
+class TestCacheEndpoints:
+    """Tests for the query cache endpoints."""
+    
+    def test_cache_stats_and_clear(self, test_client, clean_database):
+        """Test that repeated reads are served from the cache and can be cleared."""
+        event_data = {
+            "event": {
+                "class_uid": "0001",
+                "category_uid": "0002",
+                "time": "2023-01-01T12:00:00Z",
+                "severity": 5,
+                "message": "Test event",
+                "metadata": {"version": "1.0.0", "product": {"name": "Test Product"}}
+            },
+            "source_format": "ocsf"
+        }
+        
+        response = test_client.post("/events", json=event_data)
+        assert response.status_code == status.HTTP_201_CREATED
+        event_id = response.json()["id"]
+        
+        # Read the event twice; the second read is a cache hit
+        assert test_client.get(f"/events/{event_id}").status_code == 200
+        assert test_client.get(f"/events/{event_id}").status_code == 200
+        
+        response = test_client.get("/cache/stats")
+        assert response.status_code == 200
+        stats = response.json()
+        assert stats["size"] == 1
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        
+        # Missing events are not cached, so they are found once written
+        assert test_client.get("/events/999999999").status_code == 404
+        assert test_client.get("/cache/stats").json()["size"] == 1
+        
+        # Clear the cache
+        response = test_client.post("/cache/clear")
+        assert response.status_code == status.HTTP_204_NO_CONTENT
+        
+        stats = test_client.get("/cache/stats").json()
+        assert stats["size"] == 0
+        assert stats["hits"] == 0
+
+
+class TestGraphQueryEndpoint:
+    """Tests for the graph query endpoint."""
+    
+    def test_graph_query_returns_nodes_and_relationships(self, test_client, neo4j_connection, clean_database):
+        """Test that nodes and relationships keep their labels, types and endpoints."""
+        with neo4j_connection.session() as session:
+            session.run("""
+            CREATE (src:IP {id: 'ip-001', ip: '192.168.1.100'})
+            CREATE (e:Event {class_uid: '0001', category_uid: '0002', time: '2023-01-01T12:00:00Z', severity: 5})
+            CREATE (src)-[:GENERATED]->(e)
+            """)
+        
+        response = test_client.post("/graph/query", json={"query": "MATCH (s:IP)-[r:GENERATED]->(e:Event) RETURN s, r, e"})
+        assert response.status_code == 200
+        
+        graph = response.json()
+        assert len(graph["nodes"]) == 2
+        assert len(graph["relationships"]) == 1
+        
+        nodes = {node["labels"][0]: node for node in graph["nodes"]}
+        assert nodes["IP"]["properties"]["ip"] == "192.168.1.100"
+        
+        relationship = graph["relationships"][0]
+        assert relationship["type"] == "GENERATED"
+        assert relationship["start"] == nodes["IP"]["id"]
+        assert relationship["end"] == nodes["Event"]["id"]
@@ -5,40 +5,12 @@ import json
 import pytest
 from datetime import datetime
 
-from src.core import DetectionRule, detection_engine
-from src.utils import settings, db
+from src.core import DetectionRule, DetectionAlert, detection_engine, create_indexes
 
 
 class TestDetectionEngine:
     """Tests for the detection engine."""
     
-    def setup_method(self):
-        """Set up the test environment."""
-        # Save original settings
-        self.original_uri = settings.neo4j_uri
-        self.original_user = settings.neo4j_user
-        self.original_password = settings.neo4j_password
-        
-        # Override settings for testing
-        settings.neo4j_uri = "bolt://localhost:7688"
-        settings.neo4j_user = "neo4j"
-        settings.neo4j_password = "testpassword"
-        
-        # Reset the database connection to use the new settings
-        if db._driver:
-            db.close()
-    
-    def teardown_method(self):
-        """Tear down the test environment."""
-        # Restore original settings
-        settings.neo4j_uri = self.original_uri
-        settings.neo4j_user = self.original_user
-        settings.neo4j_password = self.original_password
-        
-        # Reset the database connection
-        if db._driver:
-            db.close()
-    
     def test_load_rule(self, clean_database):
         """Test loading a detection rule."""
         # Create a rule
@@ -106,25 +78,102 @@ class TestDetectionEngine:
         assert detection_engine.rules["TEST-001"].name == "Test Rule 1"
         assert detection_engine.rules["TEST-002"].name == "Test Rule 2"
     
+    def test_load_rules_from_jsonl_file(self, clean_database, tmp_path):
+        """Test loading rules from a JSON Lines file."""
+        rules_data = [
+            {
+                "rule_id": "TEST-001",
+                "name": "Test Rule 1",
+                "description": "A test rule for integration testing",
+                "severity": 5,
+                "query": "MATCH (n) RETURN n LIMIT 10",
+                "tags": ["test", "integration"],
+                "enabled": True
+            },
+            {
+                "rule_id": "TEST-002",
+                "name": "Test Rule 2",
+                "description": "Another test rule",
+                "severity": 8,
+                "query": "MATCH (n) RETURN n LIMIT $limit",
+                "parameters": {"limit": 5},
+                "enabled": False
+            }
+        ]
+        
+        # One rule per line; blank lines are skipped
+        rules_file = tmp_path / "test_rules.jsonl"
+        rules_file.write_text("\n".join(json.dumps(rule) for rule in rules_data) + "\n\n")
+        
+        detection_engine.load_rules_from_file(str(rules_file))
+        
+        assert list(detection_engine.rules) == ["TEST-001", "TEST-002"]
+        assert detection_engine.rules["TEST-001"].tags == ["test", "integration"]
+        assert detection_engine.rules["TEST-002"].parameters == {"limit": 5}
+        assert detection_engine.rules["TEST-002"].enabled is False
+    
+    def test_find_rules(self, clean_database):
+        """Test that rule lookups by tag and enabled status follow rule changes."""
+        detection_engine.clear_rules()
+        
+        detection_engine.load_rule(DetectionRule(
+            rule_id="TEST-001",
+            name="Test Rule 1",
+            description="A test rule for integration testing",
+            severity=5,
+            query="MATCH (n) RETURN n LIMIT 10",
+            tags=["test", "integration"],
+            enabled=True
+        ))
+        detection_engine.load_rule(DetectionRule(
+            rule_id="TEST-002",
+            name="Test Rule 2",
+            description="Another test rule",
+            severity=8,
+            query="MATCH (n) RETURN n LIMIT 5",
+            tags=["test", "advanced"],
+            enabled=False
+        ))
+        
+        assert [r.rule_id for r in detection_engine.find_rules()] == ["TEST-001", "TEST-002"]
+        assert [r.rule_id for r in detection_engine.find_rules(enabled=True)] == ["TEST-001"]
+        assert [r.rule_id for r in detection_engine.find_rules(enabled=False)] == ["TEST-002"]
+        assert [r.rule_id for r in detection_engine.find_rules(tag="test", enabled=False)] == ["TEST-002"]
+        assert detection_engine.find_rules(tag="missing") == []
+        
+        # Replacing a rule re-indexes its tags and enabled status
+        detection_engine.load_rule(DetectionRule(
+            rule_id="TEST-002",
+            name="Test Rule 2",
+            description="Another test rule",
+            severity=8,
+            query="MATCH (n) RETURN n LIMIT 5",
+            tags=["test"],
+            enabled=True
+        ))
+        
+        assert detection_engine.find_rules(tag="advanced") == []
+        assert [r.rule_id for r in detection_engine.find_rules(enabled=True)] == ["TEST-001", "TEST-002"]
+        
+        # Removing a rule drops it from every index
+        detection_engine.remove_rule("TEST-001")
+        
+        assert detection_engine.find_rules(tag="integration") == []
+        assert [r.rule_id for r in detection_engine.find_rules(tag="test")] == ["TEST-002"]
+    
     def test_run_detection_rule(self, neo4j_connection, clean_database):
         """Test running a detection rule."""
         # Create test data in the database
         with neo4j_connection.session() as session:
             session.run("""
             CREATE (src:IP {id: 'ip-001', ip: '192.168.1.100'})
-            CREATE (e1:Event {class_uid: '0001', category_uid: '0002', time: '2023-01-01T12:00:00Z', severity: 5})
-            CREATE (e2:Event {class_uid: '0001', category_uid: '0002', time: '2023-01-01T12:05:00Z', severity: 5})
-            CREATE (e3:Event {class_uid: '0001', category_uid: '0002', time: '2023-01-01T12:10:00Z', severity: 5})
-            CREATE (e4:Event {class_uid: '0001', category_uid: '0002', time: '2023-01-01T12:15:00Z', severity: 5})
-            CREATE (e5:Event {class_uid: '0001', category_uid: '0002', time: '2023-01-01T12:20:00Z', severity: 5})
-            CREATE (e6:Event {class_uid: '0001', category_uid: '0002', time: '2023-01-01T12:25:00Z', severity: 5})
-            CREATE (src)-[:GENERATED]->(e1)
-            CREATE (src)-[:GENERATED]->(e2)
-            CREATE (src)-[:GENERATED]->(e3)
-            CREATE (src)-[:GENERATED]->(e4)
-            CREATE (src)-[:GENERATED]->(e5)
-            CREATE (src)-[:GENERATED]->(e6)
-            """)
+            WITH src
+            UNWIND $events AS ev
+            CREATE (src)-[:GENERATED]->(:Event {class_uid: ev.class_uid, category_uid: ev.category_uid, time: ev.time, severity: ev.severity})
+            """, events=[
+                {"class_uid": "0001", "category_uid": "0002", "time": f"2023-01-01T12:{minute:02d}:00Z", "severity": 5}
+                for minute in range(0, 30, 5)
+            ])
         
         # Create a rule
         rule = DetectionRule(
@@ -153,6 +202,66 @@ class TestDetectionEngine:
         assert alerts[0].entities[0]["type"] in ['IP', 'Src']
         assert alerts[0].entities[0]["id"] == "ip-001"
     
+    def test_run_parameterized_detection_rule(self, neo4j_connection, clean_database):
+        """Test running a rule whose values are passed as query parameters."""
+        # Create test data in the database
+        with neo4j_connection.session() as session:
+            session.run("""
+            CREATE (src:IP {id: 'ip-001', ip: '192.168.1.100'})
+            WITH src
+            UNWIND range(1, 3) AS i
+            CREATE (src)-[:GENERATED]->(:Event {class_uid: '0001', category_uid: '0002', severity: 5})
+            """)
+        
+        query = "MATCH (src:IP)-[:GENERATED]->(e:Event) WHERE e.class_uid = $class_uid WITH src, count(e) as attempts WHERE attempts > $min_attempts RETURN src, attempts"
+        
+        # Rules sharing a query differ only in their parameters
+        detection_engine.load_rule(DetectionRule(
+            rule_id="TEST-001",
+            name="Low Threshold",
+            description="Detect more than two events from the same source",
+            severity=5,
+            query=query,
+            parameters={"class_uid": "0001", "min_attempts": 2}
+        ))
+        detection_engine.load_rule(DetectionRule(
+            rule_id="TEST-002",
+            name="High Threshold",
+            description="Detect more than five events from the same source",
+            severity=7,
+            query=query,
+            parameters={"class_uid": "0001", "min_attempts": 5}
+        ))
+        
+        assert detection_engine.rules["TEST-001"].to_dict()["parameters"] == {"class_uid": "0001", "min_attempts": 2}
+        
+        # Only the rule with the lower threshold matches
+        alerts = detection_engine.run_detection()
+        
+        assert [alert.rule_id for alert in alerts] == ["TEST-001"]
+        assert alerts[0].context["raw_result"]["attempts"] == "3"
+    
+    def test_create_indexes(self, neo4j_connection, clean_database):
+        """Test creating the Event and entity indexes."""
+        # Creating the indexes again is a no-op
+        assert create_indexes()
+        assert create_indexes()
+        
+        with neo4j_connection.session() as session:
+            session.run("CALL db.awaitIndexes(60)").consume()
+            result = session.run("""
+            SHOW INDEXES YIELD name, labelsOrTypes, properties, state
+            WHERE name IN ['event_class_uid', 'event_class_category', 'entity_ip_id']
+            RETURN name, labelsOrTypes, properties, state ORDER BY name
+            """)
+            indexes = [record.data() for record in result]
+        
+        assert indexes == [
+            {"name": "entity_ip_id", "labelsOrTypes": ["IP"], "properties": ["id"], "state": "ONLINE"},
+            {"name": "event_class_category", "labelsOrTypes": ["Event"], "properties": ["class_uid", "category_uid"], "state": "ONLINE"},
+            {"name": "event_class_uid", "labelsOrTypes": ["Event"], "properties": ["class_uid"], "state": "ONLINE"}
+        ]
+    
     def test_run_all_detection_rules(self, neo4j_connection, clean_database):
         """Test running all detection rules."""
         # Create test data in the database
@@ -198,8 +307,9 @@ class TestDetectionEngine:
         # Run all rules
         alerts = detection_engine.run_detection()
         
-        # Verify the alerts
+        # Verify the alerts; rules run concurrently but alerts keep the rule order
         assert len(alerts) == 2
+        assert [a.rule_id for a in alerts] == ["TEST-001", "TEST-002"]
         
         # Find alerts by rule ID
         rule1_alerts = [a for a in alerts if a.rule_id == "TEST-001"]
@@ -242,16 +352,68 @@ class TestDetectionEngine:
         # Verify the result
         assert result is True
         
-        # Verify the alert was stored in the database
+        # Verify the alert and its entity with one query. The entity could be
+        # either IP or Src depending on how it was created, so match any label
         with neo4j_connection.session() as session:
-            # Check Alert node
+            result = session.run("""
+            RETURN
+                COUNT { (:Alert) } AS alerts,
+                [(:Alert)-[:INVOLVES]->(e) WHERE e.id = 'ip-001' | e.id] AS involved
+            """)
+            
+            assert result.single().data() == {"alerts": 1, "involved": ["ip-001"]}
+    
+    def test_store_alerts_bulk(self, neo4j_connection, clean_database):
+        """Test storing a batch of alerts with a single query."""
+        # Create an existing entity in the database
+        with neo4j_connection.session() as session:
+            session.run("CREATE (src:IP {id: 'ip-001', ip: '192.168.1.100'})")
+        
+        alerts = [
+            DetectionAlert(
+                alert_id="alert-001",
+                rule_id="TEST-001",
+                timestamp="2023-01-01T12:00:00Z",
+                severity=7,
+                entities=[{"type": "IP", "id": "ip-001", "properties": {"ip": "192.168.1.100"}}]
+            ),
+            DetectionAlert(
+                alert_id="alert-002",
+                rule_id="TEST-001",
+                timestamp="2023-01-01T12:05:00Z",
+                severity=7,
+                entities=[
+                    {"type": "IP", "id": "ip-001", "properties": {"ip": "192.168.1.100"}},
+                    {"type": "Host", "id": "host-001", "properties": {"hostname": "web-1"}}
+                ]
+            ),
+            DetectionAlert(
+                alert_id="alert-003",
+                rule_id="TEST-001",
+                timestamp="2023-01-01T12:10:00Z",
+                severity=7,
+                entities=[]
+            )
+        ]
+        
+        # Store the alerts
+        result = detection_engine.store_alerts_bulk(alerts)
+        
+        # Verify the result
+        assert result is True
+        
+        with neo4j_connection.session() as session:
+            # Alerts without entities are stored too
             result = session.run("MATCH (a:Alert) RETURN count(a) as count")
+            assert result.single()["count"] == 3
+            
+            result = session.run("MATCH (:Alert)-[r:INVOLVES]->() RETURN count(r) as count")
+            assert result.single()["count"] == 3
+            
+            # Existing entities are linked, not duplicated
+            result = session.run("MATCH (ip:IP {id: 'ip-001'}) RETURN count(ip) as count")
             assert result.single()["count"] == 1
             
-            # Check relationship to entity - could be either IP or Src depending on how the entity was created
-            result = session.run("""
-            MATCH (a:Alert)-[:INVOLVES]->(e)
-            WHERE e.id = 'ip-001'
-            RETURN e.id as id
-            """)
-            assert result.single()["id"] == "ip-001" 
\ No newline at end of file
+            # Missing entities are created with their properties
+            result = session.run("MATCH (:Alert {alert_id: 'alert-002'})-[:INVOLVES]->(h:Host) RETURN h.hostname as hostname")
+            assert result.single()["hostname"] == "web-1"
@@ -5,9 +5,10 @@ import os
 import json
 import pytest
 import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from jsonschema import ValidationError
 
-from src.schemas.ocsf_schema import OCSFSchema
+from src.schemas.ocsf_schema import OCSFSchema, SCHEMA_CACHE_PREFIX
 from src.schemas import ocsf_schema
 
 
@@ -59,6 +60,55 @@ class TestOCSFSchema:
         assert test_schema.schemas["test_json"]["title"] == "Test JSON Schema"
         assert test_schema.schemas["test_yaml"]["title"] == "Test YAML Schema"
     
+    def test_load_schemas_cache(self, tmp_path):
+        """Test that parsed schemas are cached and refreshed when files change."""
+        schema_dir = tmp_path / "schemas"
+        schema_dir.mkdir()
+        cache_dir = tmp_path / "cache"
+        
+        with open(schema_dir / "test_json.json", "w") as f:
+            json.dump({"type": "object", "title": "Original"}, f)
+        
+        # The first load parses the files and writes the cache, leaving the schema directory alone
+        first_schema = OCSFSchema(schema_path=str(schema_dir), auto_load=False, cache_dir=str(cache_dir))
+        first_schema.load_schemas()
+        
+        assert [path.name.startswith(SCHEMA_CACHE_PREFIX) for path in cache_dir.iterdir()] == [True]
+        assert [path.name for path in schema_dir.iterdir()] == ["test_json.json"]
+        assert first_schema.schemas["test_json"]["title"] == "Original"
+        
+        # A later load reads the same schemas back from the cache
+        cached_schema = OCSFSchema(schema_path=str(schema_dir), auto_load=False, cache_dir=str(cache_dir))
+        cached_schema.load_schemas()
+        
+        assert cached_schema.schemas == first_schema.schemas
+        
+        # Changing a schema file invalidates the cache
+        with open(schema_dir / "test_json.json", "w") as f:
+            json.dump({"type": "object", "title": "Updated schema"}, f)
+        
+        updated_schema = OCSFSchema(schema_path=str(schema_dir), auto_load=False, cache_dir=str(cache_dir))
+        updated_schema.load_schemas()
+        
+        assert updated_schema.schemas["test_json"]["title"] == "Updated schema"
+    
+    def test_load_schemas_unwritable_cache(self, tmp_path):
+        """Test that schemas still load when the cache cannot be written."""
+        schema_dir = tmp_path / "schemas"
+        schema_dir.mkdir()
+        
+        with open(schema_dir / "test_json.json", "w") as f:
+            json.dump({"type": "object", "title": "Test JSON Schema"}, f)
+        
+        # A file where the cache directory should be makes every cache write fail
+        blocked_dir = tmp_path / "not-a-directory"
+        blocked_dir.write_text("")
+        
+        test_schema = OCSFSchema(schema_path=str(schema_dir), auto_load=False, cache_dir=str(blocked_dir))
+        test_schema.load_schemas()
+        
+        assert test_schema.schemas["test_json"]["title"] == "Test JSON Schema"
+    
     def test_validate_event(self, tmp_path):
         """Test validating an event against a schema."""
         # Create a temporary schema file
@@ -112,6 +162,25 @@ class TestOCSFSchema:
         assert test_schema.validate_event(invalid_event_1, "event") is False
         assert test_schema.validate_event(invalid_event_2, "event") is False
     
+    def test_validate_event_loads_schemas_once(self, tmp_path):
+        """Test that concurrent first validations wait for one complete schema load."""
+        schema_dir = tmp_path / "schemas"
+        schema_dir.mkdir()
+        
+        # Several schemas, so a partial load would miss some of them
+        for name in ["event", "alert", "network", "process"]:
+            with open(schema_dir / f"{name}.json", "w") as f:
+                json.dump({"type": "object", "required": ["class_uid"]}, f)
+        
+        test_schema = OCSFSchema(schema_path=str(schema_dir), auto_load=False)
+        
+        schema_types = ["event", "alert", "network", "process"] * 8
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(lambda schema_type: test_schema.validate_event({"class_uid": "0001"}, schema_type), schema_types))
+        
+        assert all(results)
+        assert sorted(test_schema.schemas) == ["alert", "event", "network", "process"]
+    
     def test_map_to_ocsf(self):
         """Test mapping events to OCSF format."""
         # Test mapping a syslog event
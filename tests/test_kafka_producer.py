@@ -0,0 +1,28 @@
+"""
+Unit tests for the Kafka producer.
+"""
+import pytest
+
+from src.kafka.producer import KafkaProducer
+
+
+@pytest.fixture
+def producer():
+    """Create a producer; no broker is needed until a message is sent."""
+    kafka_producer = KafkaProducer(bootstrap_servers="localhost:9092", topic="test-events")
+    
+    yield kafka_producer
+    
+    kafka_producer.close()
+
+
+class TestKafkaProducer:
+    """Tests for KafkaProducer."""
+    
+    @pytest.mark.parametrize("keys", [["key-1"], ["key-1", "key-2", "key-3"]])
+    def test_send_event_batch_rejects_mismatched_keys(self, producer, keys):
+        """Test that a batch is not sent unless there is one key per event."""
+        events = [{"message": "first"}, {"message": "second"}]
+        
+        with pytest.raises(ValueError, match=f"Got {len(keys)} keys for 2 events"):
+            producer.send_event_batch(events, keys=keys)
@@ -0,0 +1,45 @@
+"""
+Unit tests for the query result cache.
+"""
+from src.utils.query_cache import QueryCache
+
+
+QUERY = "MATCH (e:Event) WHERE id(e) = $event_id RETURN e"
+
+
+class TestQueryCache:
+    """Tests for QueryCache."""
+    
+    def test_cache_drops_results_read_across_a_write(self):
+        """Test that a result read before an invalidation is not cached after it."""
+        cache = QueryCache(max_size=8, ttl=30.0)
+        
+        # A read starts, a write invalidates the cache, then the read finishes
+        version = cache.version
+        assert cache.get(QUERY, {"event_id": 1}) is None
+        cache.invalidate()
+        cache.set(QUERY, {"event_id": 1}, [{"e": "stale"}], version=version)
+        
+        assert cache.get(QUERY, {"event_id": 1}) is None
+        
+        # A read started after the write is cached
+        version = cache.version
+        cache.set(QUERY, {"event_id": 1}, [{"e": "fresh"}], version=version)
+        
+        assert cache.get(QUERY, {"event_id": 1}) == [{"e": "fresh"}]
+    
+    def test_cache_evicts_least_recently_used(self):
+        """Test that the cache keeps at most max_size results."""
+        cache = QueryCache(max_size=2, ttl=30.0)
+        
+        cache.set(QUERY, {"event_id": 1}, [1])
+        cache.set(QUERY, {"event_id": 2}, [2])
+        
+        # Reading the first result makes the second the least recently used
+        assert cache.get(QUERY, {"event_id": 1}) == [1]
+        cache.set(QUERY, {"event_id": 3}, [3])
+        
+        assert cache.get(QUERY, {"event_id": 2}) is None
+        assert cache.get(QUERY, {"event_id": 1}) == [1]
+        assert cache.get(QUERY, {"event_id": 3}) == [3]
+        assert cache.stats()["size"] == 2